@@ -0,0 +1,564 @@
+"""Step thousands of independent Coin Collector games in lockstep with NumPy.
+
+BatchGame keeps the state of N games in structure-of-arrays form: one row
+per game in the coin, obstacle and power-up position arrays, and one entry
+per game in the score/health/level/speed arrays. Falling motion, collision
+against the player rect, scoring and power-up handling run as array
+operations over all games at once.
+
+Results match Game.update() exactly for the same seed and input: a game
+seeded with `s` here plays out the same as `Game(seed=s)`.
+Random draws (respawns, power-up spawns) use one random.Random per game,
+seeded like Game.rng, so they come out in the same order, and the few games that respawn, collect
+or get hit on a given tick replay that tick's entity loop exactly as
+Game.update() runs it, including level advancement in the middle of it.
+Spawn rules come from the Game's SpawnDirector, and rules authored for a
+level (`level_rules`) apply to every game, waves included.
+
+    python batch.py --games 4000 --ticks 3600
+    python batch.py --games 200 --ticks 3600 --verify
+    python batch.py --games 200 --ticks 3600 --verify --authored
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from main import (BASE_HEIGHT, BASE_WIDTH, TICK_RATE, POWERUP_DOUBLE_POINTS,
+                  POWERUP_HEALTH, POWERUP_INVINCIBLE, POWERUP_SLOW_OBSTACLES,
+                  Game, PowerUp)
+from headless import ChaseInput
+from inputs import InputProvider, InputState
+from spawns import Wave
+
+# Columns of the active power-up arrays, in Game.active_power_ups order
+TIMED_POWER_UPS = (POWERUP_INVINCIBLE, POWERUP_DOUBLE_POINTS, POWERUP_SLOW_OBSTACLES)
+INVINCIBLE, DOUBLE_POINTS, SLOW_OBSTACLES = range(3)
+
+# Codes stored in the falling power-up type array
+POWER_UP_CODES = {power_up_type: code for code, power_up_type in enumerate(
+    (POWERUP_INVINCIBLE, POWERUP_DOUBLE_POINTS, POWERUP_SLOW_OBSTACLES, POWERUP_HEALTH))}
+HEALTH = POWER_UP_CODES[POWERUP_HEALTH]
+
+# Rules for --verify --authored: denser first level, drops on the tick a
+# level starts, random and fixed types, and drops on the same ticks as
+# random spawns
+VERIFY_LEVEL_RULES = {
+    1: {'waves': [Wave(0, [0.1, 0.5, 0.9]), Wave(1500, [0.5] * 4, spacing=250)],
+        'max_coins': 6, 'max_obstacles': 4},
+    2: {'waves': [Wave(500, [0.2, 0.4, 0.6, 0.8], POWERUP_HEALTH, spacing=100)],
+        'power_up_chance': 0.05},
+    3: {'waves': [Wave(ms, [ms / 10000], spacing=0) for ms in range(0, 10000, 200)],
+        'power_up_chance': 0.2},
+}
+
+
+def _overlap(ax, ay, a_size, bx, by, b_size):
+    """Vectorized pygame.Rect.colliderect on integer coordinates."""
+    return (ax < bx + b_size) & (ay < by + b_size) & (ax + a_size > bx) & (ay + a_size > by)
+
+
+def _collides(a, b):
+    """Scalar colliderect for (x, y, size) rects, truncating like pygame.Rect."""
+    ax, ay, a_size = int(a[0]), int(a[1]), a[2]
+    bx, by, b_size = int(b[0]), int(b[1]), b[2]
+    return ax < bx + b_size and ay < by + b_size and ax + a_size > bx and ay + a_size > by
+
+
+class BatchGame:
+    def __init__(self, seeds, width=BASE_WIDTH, height=BASE_HEIGHT, tick_rate=TICK_RATE,
+                 swarm=False, level_rules=None):
+        self.seeds = list(seeds)
+        self.n = n = len(self.seeds)
+        self.width = width
+        self.height = height
+        self.ticks = 0
+
+        # Take every setting from a real Game so the two can't drift apart
+        template = Game(width=width, height=height, tick_rate=tick_rate, swarm=swarm)
+        # {level: settings}, as SpawnDirector.set_level() takes them
+        for level, settings in (level_rules or {}).items():
+            template.spawns.set_level(level, **settings)
+        template.spawns.keep = None  # the games are on many levels at once
+        self.template = template
+        self.dt = template.dt
+        self.scale = min(width / BASE_WIDTH, height / BASE_HEIGHT)
+        sample = PowerUp(0, 0, POWERUP_HEALTH)
+        self.power_up_size = sample.size
+        self.power_up_ticks = template.ticks_for(sample.duration * 1000)
+        self.invulnerable_ticks = template.ticks_for(template.invulnerable_duration)
+
+        self.rngs = [random.Random(seed) for seed in self.seeds]
+
+        # Per-game scalars
+        self.player_x = np.full(n, float(template.player_x))
+        self.score = np.zeros(n, dtype=np.int64)
+        self.level = np.ones(n, dtype=np.int64)
+        self.coins_collected_this_level = np.zeros(n, dtype=np.int64)
+        self.health = np.full(n, template.max_health, dtype=np.int64)
+        self.invulnerable = np.zeros(n, dtype=bool)
+        self.invulnerable_until = np.zeros(n, dtype=np.int64)
+        self.game_over = np.zeros(n, dtype=bool)
+        self.game_over_tick = np.full(n, -1, dtype=np.int64)
+        self.coin_speed = np.full(n, float(template.coin_speed))
+        self.obstacle_speed = np.full(n, float(template.obstacle_speed))
+        self.original_obstacle_speed = np.full(n, float(template.original_obstacle_speed))
+
+        # Active timed power-ups: one column per TIMED_POWER_UPS entry
+        self.power_up_active = np.zeros((n, len(TIMED_POWER_UPS)), dtype=bool)
+        self.power_up_expiry = np.zeros((n, len(TIMED_POWER_UPS)), dtype=np.int64)
+
+        # Coins and obstacles, stored per game in Game's list order
+        self.coin_count = np.zeros(n, dtype=np.int64)
+        self.coin_x = np.zeros((n, template.max_coins))
+        self.coin_y = np.zeros((n, template.max_coins))
+        self.obstacle_count = np.zeros(n, dtype=np.int64)
+        self.obstacle_x = np.zeros((n, template.max_obstacles))
+        self.obstacle_y = np.zeros((n, template.max_obstacles))
+
+        # Each game's power-up timeline, as Game's start_spawns,
+        # spawn_power_up and drop_power_up timers: the tick its level's
+        # spawns start on, the tick of its next spawn and of its next wave
+        # drop (-1 for none), the index of that drop in the level's drops,
+        # and whether the next spawn is the level's first, which comes
+        # before drops due on the same tick, where later spawns come after
+        self.spawns_start = np.ones(n, dtype=np.int64)
+        self.next_power_up = np.full(n, -1, dtype=np.int64)
+        self.next_drop = np.full(n, -1, dtype=np.int64)
+        self.drop_index = np.zeros(n, dtype=np.int64)
+        self.first_power_up = np.zeros(n, dtype=bool)
+
+        # Falling power-ups: order never matters, so they live in free slots
+        self.power_up_alive = np.zeros((n, 4), dtype=bool)
+        self.power_up_x = np.zeros((n, 4))
+        self.power_up_y = np.zeros((n, 4))
+        self.power_up_type = np.zeros((n, 4), dtype=np.int64)
+
+        # Game.__init__ creates its coins, then its obstacles
+        count = template.entity_multiplier
+        for g, rng in enumerate(self.rngs):
+            self._store_row('coin', g, [self._new_coin(rng) for _ in range(count)])
+            self._store_row('obstacle', g, [self._new_obstacle(rng) for _ in range(count)])
+
+    # Random draws, in the same order and ranges as Game.create_*()
+    def _new_coin(self, rng):
+        t = self.template
+        return rng.randint(0, self.width - t.coin_size), rng.randint(-100, 0)
+
+    def _new_obstacle(self, rng):
+        t = self.template
+        return rng.randint(0, self.width - t.obstacle_size), rng.randint(-200, -50)
+
+    def _new_power_up(self, g):
+        t = self.template
+        rng = self.rngs[g]
+        available = t.spawns.rules(int(self.level[g])).power_ups
+        if not available:
+            return None
+        power_up_type = rng.choice(available)
+        return (rng.randint(0, self.width - t.base_powerup_size),
+                rng.randint(-100, -30),
+                POWER_UP_CODES[power_up_type])
+
+    @staticmethod
+    def _grow(array, size):
+        grown = np.zeros((array.shape[0], size), dtype=array.dtype)
+        grown[:, :array.shape[1]] = array
+        return grown
+
+    def _store_row(self, kind, g, row):
+        xs, ys = getattr(self, kind + '_x'), getattr(self, kind + '_y')
+        if len(row) > xs.shape[1]:
+            xs = self._grow(xs, len(row))
+            ys = self._grow(ys, len(row))
+            setattr(self, kind + '_x', xs)
+            setattr(self, kind + '_y', ys)
+        for i, (x, y) in enumerate(row):
+            xs[g, i] = x
+            ys[g, i] = y
+        getattr(self, kind + '_count')[g] = len(row)
+
+    def _row(self, kind, g):
+        count = getattr(self, kind + '_count')[g]
+        xs = getattr(self, kind + '_x')[g, :count].tolist()
+        ys = getattr(self, kind + '_y')[g, :count].tolist()
+        return [[x, y] for x, y in zip(xs, ys)]
+
+    def _advance_level(self, g, coins, obstacles):
+        """Game.advance_level() for one game; coins/obstacles are its live rows."""
+        t = self.template
+        rng = self.rngs[g]
+        level = int(self.level[g]) + 1
+        self.level[g] = level
+        self.coins_collected_this_level[g] = 0
+        rules = t.spawns.rules(level)
+        self.spawns_start[g] = self.ticks + 1
+        self.next_power_up[g] = -1
+        self.next_drop[g] = -1
+
+        self.coin_speed[g] = (t.base_coin_speed *
+                              (t.level_multiplier ** (level - 1)) *
+                              self.scale)
+        self.obstacle_speed[g] = (t.base_obstacle_speed *
+                                  (t.level_multiplier ** (level - 1)) *
+                                  self.scale)
+        self.original_obstacle_speed[g] = self.obstacle_speed[g]
+
+        while len(coins) < rules.max_coins:
+            coins.append(list(self._new_coin(rng)))
+        while len(obstacles) < rules.max_obstacles:
+            obstacles.append(list(self._new_obstacle(rng)))
+
+        if level % 5 == 0:
+            self.health[g] = min(t.max_health, self.health[g] + 1)
+
+    def _replay_coins(self, g, player):
+        """Game.update()'s coin pass for one game, run exactly as written."""
+        t = self.template
+        rng = self.rngs[g]
+        coins = self._row('coin', g)
+        obstacles = None
+        speed = float(self.coin_speed[g]) * self.dt
+        for coin in coins:
+            coin[1] += speed
+            if coin[1] > self.height:
+                coin[:] = self._new_coin(rng)
+
+        for coin in [coin for coin in coins if _collides(player, (coin[0], coin[1], t.coin_size))]:
+            points = int(self.level[g])
+            if self.power_up_active[g, DOUBLE_POINTS]:
+                points *= 2
+            self.score[g] += points
+            self.coins_collected_this_level[g] += 1
+            coin[:] = self._new_coin(rng)
+
+            if self.coins_collected_this_level[g] >= t.coins_for_next_level:
+                if obstacles is None:
+                    obstacles = self._row('obstacle', g)
+                self._advance_level(g, coins, obstacles)
+        self._store_row('coin', g, coins)
+        if obstacles is not None:
+            self._store_row('obstacle', g, obstacles)
+
+    def _replay_obstacles(self, g, player, power_up_invincible):
+        """Game.update()'s obstacle pass for one game, run exactly as written."""
+        t = self.template
+        rng = self.rngs[g]
+        obstacles = self._row('obstacle', g)
+        speed = float(self.obstacle_speed[g]) * self.dt
+        for obstacle in obstacles:
+            obstacle[1] += speed
+            if obstacle[1] > self.height:
+                obstacle[:] = self._new_obstacle(rng)
+
+        for obstacle in [obstacle for obstacle in obstacles
+                         if _collides(player, (obstacle[0], obstacle[1], t.obstacle_size))]:
+            if not self.invulnerable[g] and not power_up_invincible:
+                self.health[g] -= 1
+                if self.health[g] <= 0:
+                    self.game_over[g] = True
+                    break
+                else:
+                    self.invulnerable[g] = True
+                    self.invulnerable_until[g] = self.ticks + self.invulnerable_ticks
+                    obstacle[:] = self._new_obstacle(rng)
+        self._store_row('obstacle', g, obstacles)
+
+    def _schedule_power_up(self, g, after):
+        gap = self.template.spawns.rules(int(self.level[g])).gap(self.rngs[g])
+        self.next_power_up[g] = -1 if gap is None else after + gap
+
+    def _top_up(self, g, rules):
+        """Coins and obstacles up to the level's counts, as Game.start_spawns() adds them."""
+        rng = self.rngs[g]
+        if self.coin_count[g] < rules.max_coins:
+            coins = self._row('coin', g)
+            while len(coins) < rules.max_coins:
+                coins.append(list(self._new_coin(rng)))
+            self._store_row('coin', g, coins)
+        if self.obstacle_count[g] < rules.max_obstacles:
+            obstacles = self._row('obstacle', g)
+            while len(obstacles) < rules.max_obstacles:
+                obstacles.append(list(self._new_obstacle(rng)))
+            self._store_row('obstacle', g, obstacles)
+
+    def _schedule_drop(self, g, rules):
+        index = int(self.drop_index[g])
+        if index < len(rules.drops):
+            self.next_drop[g] = self.spawns_start[g] - 1 + rules.drops[index][0]
+        else:
+            self.next_drop[g] = -1
+
+    def _spawn_power_ups(self, running):
+        # Levels whose spawns start this tick draw the wait for their first
+        # power-up, which can be due on this same tick, and line up their drops
+        for g in np.flatnonzero(running & (self.spawns_start == self.ticks)):
+            rules = self.template.spawns.rules(int(self.level[g]))
+            self._top_up(g, rules)
+            self._schedule_power_up(g, self.ticks - 1)
+            self.first_power_up[g] = True
+            self.drop_index[g] = 0
+            self._schedule_drop(g, rules)
+        due = running & ((self.next_power_up == self.ticks) | (self.next_drop == self.ticks))
+        for g in np.flatnonzero(due):
+            self._run_spawns(g)
+
+    def _run_spawns(self, g):
+        """Game's spawn_power_up and drop_power_up events due this tick for
+        one game, in the order its Scheduler would run them."""
+        t = self.template
+        rules = t.spawns.rules(int(self.level[g]))
+        spawn = self.next_power_up[g] == self.ticks
+        while spawn or self.next_drop[g] == self.ticks:
+            if spawn and (self.next_drop[g] != self.ticks or self.first_power_up[g]):
+                spawn = False
+                self.first_power_up[g] = False
+                new_power_up = self._new_power_up(g)
+                self._schedule_power_up(g, self.ticks)
+                if new_power_up is not None:
+                    self._add_power_up(g, new_power_up)
+                continue
+            _, column, power_up_type = rules.drops[self.drop_index[g]]
+            self.drop_index[g] += 1
+            self._schedule_drop(g, rules)
+            if power_up_type is None:
+                if not rules.power_ups:
+                    continue
+                power_up_type = self.rngs[g].choice(rules.power_ups)
+            x = round(column * (self.width - t.base_powerup_size))
+            self._add_power_up(g, (x, -t.base_powerup_size, POWER_UP_CODES[power_up_type]))
+
+    def _add_power_up(self, g, new_power_up):
+        free = np.flatnonzero(~self.power_up_alive[g])
+        if len(free) == 0:
+            for name in ('power_up_alive', 'power_up_x', 'power_up_y', 'power_up_type'):
+                array = getattr(self, name)
+                setattr(self, name, self._grow(array, array.shape[1] * 2))
+            free = np.flatnonzero(~self.power_up_alive[g])
+        slot = free[0]
+        self.power_up_x[g, slot], self.power_up_y[g, slot], self.power_up_type[g, slot] = new_power_up
+        self.power_up_alive[g, slot] = True
+
+    def chase_inputs(self):
+        """Input that steers every player toward its lowest coin.
+
+        The vectorized twin of headless.ChaseInput, used as a baseline bot.
+        """
+        t = self.template
+        slots = np.arange(self.coin_y.shape[1])
+        coin_y = np.where(slots < self.coin_count[:, None], self.coin_y, -np.inf)
+        lowest = coin_y.argmax(axis=1)
+        target = self.coin_x[np.arange(self.n), lowest] + t.coin_size / 2
+        center = self.player_x + t.player_size / 2
+        step = t.player_speed * self.dt
+        return target < center - step, target > center + step
+
+    def step(self, n=1, left=False, right=False):
+        """Advance every game by n ticks with the given input held.
+
+        `left`/`right` are bools or boolean arrays with one entry per game.
+        Games that are over stay frozen, like Game.update() does.
+        """
+        left = np.broadcast_to(np.asarray(left, dtype=bool), (self.n,))
+        right = np.broadcast_to(np.asarray(right, dtype=bool), (self.n,))
+        for _ in range(n):
+            self._tick(left, right)
+
+    def step_chasing(self, n=1):
+        """Advance every game by n ticks, steered by chase_inputs().
+
+        Each tick's input is worked out where Game.update() reads it, after
+        its timers, which can add coins when a level's spawns start.
+        """
+        for _ in range(n):
+            self._tick(None, None)
+
+    def _tick(self, left, right):
+        t = self.template
+        self.ticks += 1
+        running = ~self.game_over
+        if not running.any():
+            return
+
+        # Game's timers: power-ups run out on their expiry tick, and so does
+        # invulnerability, except while invincible, where it ends with that
+        expired = self.power_up_active & (self.ticks >= self.power_up_expiry)
+        np.copyto(self.obstacle_speed, self.original_obstacle_speed, where=expired[:, SLOW_OBSTACLES])
+        self.power_up_active &= ~expired
+        power_up_invincible = self.power_up_active[:, INVINCIBLE].copy()
+        self.invulnerable &= ~expired[:, INVINCIBLE]
+        self.invulnerable &= ~((self.ticks >= self.invulnerable_until) & ~power_up_invincible)
+
+        # Spawn and move falling power-ups
+        self._spawn_power_ups(running)
+        if left is None:
+            left, right = self.chase_inputs()
+        falling = self.power_up_alive & running[:, None]
+        np.add(self.power_up_y, t.power_up_speed * self.dt, out=self.power_up_y, where=falling)
+        self.power_up_alive &= ~(falling & (self.power_up_y > self.height))
+
+        # Player movement
+        move_left = running & left & (self.player_x > 0)
+        np.subtract(self.player_x, t.player_speed * self.dt, out=self.player_x, where=move_left)
+        move_right = running & right & (self.player_x < self.width - t.player_size)
+        np.add(self.player_x, t.player_speed * self.dt, out=self.player_x, where=move_right)
+
+        player_x = self.player_x.astype(np.int64)[:, None]
+        player_y = int(t.player_y)
+        player_size = t.player_size
+
+        # Coins: move everything, then replay games that hit an event
+        slots = np.arange(self.coin_x.shape[1])
+        live = running[:, None] & (slots < self.coin_count[:, None])
+        coin_y = self.coin_y + self.coin_speed[:, None] * self.dt
+        events = live & ((coin_y > self.height) |
+                         _overlap(player_x, player_y, player_size,
+                                  self.coin_x.astype(np.int64), coin_y.astype(np.int64),
+                                  t.coin_size))
+        replay = events.any(axis=1)
+        quiet = live & ~replay[:, None]
+        np.copyto(self.coin_y, coin_y, where=quiet)
+        for g in np.flatnonzero(replay):
+            self._replay_coins(g, (self.player_x[g], player_y, player_size))
+
+        # Obstacles, against the obstacle speed left by the coin pass
+        slots = np.arange(self.obstacle_x.shape[1])
+        live = running[:, None] & (slots < self.obstacle_count[:, None])
+        obstacle_y = self.obstacle_y + self.obstacle_speed[:, None] * self.dt
+        vulnerable = ~self.invulnerable & ~power_up_invincible
+        events = live & ((obstacle_y > self.height) |
+                         (vulnerable[:, None] &
+                          _overlap(player_x, player_y, player_size,
+                                   self.obstacle_x.astype(np.int64), obstacle_y.astype(np.int64),
+                                   t.obstacle_size)))
+        replay = events.any(axis=1)
+        quiet = live & ~replay[:, None]
+        np.copyto(self.obstacle_y, obstacle_y, where=quiet)
+        for g in np.flatnonzero(replay):
+            self._replay_obstacles(g, (self.player_x[g], player_y, player_size),
+                                   power_up_invincible[g])
+
+        # Power-up pickups
+        collected = (self.power_up_alive & running[:, None] &
+                     _overlap(player_x, player_y, player_size,
+                              self.power_up_x.astype(np.int64), self.power_up_y.astype(np.int64),
+                              self.power_up_size))
+        if collected.any():
+            health = (collected & (self.power_up_type == HEALTH)).sum(axis=1)
+            self.health = np.where(health > 0, np.minimum(t.max_health, self.health + health),
+                                   self.health)
+            for column in range(len(TIMED_POWER_UPS)):
+                activated = (collected & (self.power_up_type == column)).any(axis=1)
+                self.power_up_active[activated, column] = True
+                self.power_up_expiry[activated, column] = self.ticks + self.power_up_ticks
+                if column == SLOW_OBSTACLES:
+                    self.obstacle_speed[activated] = self.original_obstacle_speed[activated] * 0.5
+            self.power_up_alive &= ~collected
+
+        self.game_over_tick[running & self.game_over] = self.ticks
+
+
+class _ArrayInput(InputProvider):
+    """Feeds one game the same per-tick input a BatchGame column gets."""
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+
+    def read(self, game):
+        tick = game.ticks - 1
+        return InputState(bool(self.left[tick]), bool(self.right[tick]))
+
+
+def random_inputs(n, ticks, seed=0, hold=30):
+    """Random left/right input for n games, each held for `hold` ticks."""
+    rng = np.random.default_rng(seed)
+    direction = np.repeat(rng.integers(-1, 2, size=(ticks // hold + 1, n)), hold, axis=0)[:ticks]
+    return direction < 0, direction > 0
+
+
+def verify(seeds, ticks, bot='chase', swarm=False, level_rules=None):
+    """Run each seed through Game and through BatchGame and compare results.
+
+    `bot` is 'chase' (headless.ChaseInput) or 'random' (random_inputs()).
+    Returns the list of seeds whose results differ.
+    """
+    seeds = list(seeds)
+    batch = BatchGame(seeds, swarm=swarm, level_rules=level_rules)
+    if bot == 'random':
+        left, right = random_inputs(len(seeds), ticks)
+        for tick in range(ticks):
+            batch.step(1, left[tick], right[tick])
+    else:
+        batch.step_chasing(ticks)
+
+    mismatched = []
+    for g, seed in enumerate(seeds):
+        if bot == 'random':
+            input_provider = _ArrayInput(left[:, g], right[:, g])
+        else:
+            input_provider = ChaseInput()
+        game = Game(input_provider=input_provider, swarm=swarm, seed=seed)
+        for level, settings in (level_rules or {}).items():
+            game.spawns.set_level(level, **settings)
+        for _ in range(ticks):
+            game.update()
+        expected = (game.score, game.level, game.current_health, game.game_over, game.player_x,
+                    sorted((c.x, c.y) for c in game.coins),
+                    sorted((o.x, o.y) for o in game.obstacles),
+                    sorted((p.x, p.y, POWER_UP_CODES[p.type]) for p in game.power_ups))
+        coins = sorted(zip(batch.coin_x[g, :batch.coin_count[g]].tolist(),
+                           batch.coin_y[g, :batch.coin_count[g]].tolist()))
+        obstacles = sorted(zip(batch.obstacle_x[g, :batch.obstacle_count[g]].tolist(),
+                               batch.obstacle_y[g, :batch.obstacle_count[g]].tolist()))
+        alive = batch.power_up_alive[g]
+        power_ups = sorted(zip(batch.power_up_x[g, alive].tolist(),
+                               batch.power_up_y[g, alive].tolist(),
+                               batch.power_up_type[g, alive].tolist()))
+        actual = (int(batch.score[g]), int(batch.level[g]), int(batch.health[g]),
+                  bool(batch.game_over[g]), float(batch.player_x[g]), coins, obstacles, power_ups)
+        if expected != actual:
+            mismatched.append(seed)
+    return mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many Coin Collector games in lockstep")
+    parser.add_argument('--games', type=int, default=4000)
+    parser.add_argument('--ticks', type=int, default=3600)
+    parser.add_argument('--seed', type=int, default=0, help="seed of the first game")
+    parser.add_argument('--bot', choices=['chase', 'random'], default='chase')
+    parser.add_argument('--swarm', action='store_true', help="use swarm-mode entity counts")
+    parser.add_argument('--verify', action='store_true',
+                        help="check every game against Game.update() instead of timing")
+    parser.add_argument('--authored', action='store_true',
+                        help="author entity counts, power-up waves and chances for the first levels")
+    args = parser.parse_args()
+    seeds = range(args.seed, args.seed + args.games)
+    level_rules = VERIFY_LEVEL_RULES if args.authored else None
+
+    if args.verify:
+        mismatched = verify(seeds, args.ticks, args.bot, args.swarm, level_rules)
+        print(f"{args.games - len(mismatched)}/{args.games} games match Game.update()")
+        if mismatched:
+            print(f"mismatched seeds: {mismatched[:20]}")
+            raise SystemExit(1)
+        return
+
+    batch = BatchGame(seeds, swarm=args.swarm, level_rules=level_rules)
+    left, right = random_inputs(args.games, args.ticks)
+    start = time.perf_counter()
+    for tick in range(args.ticks):
+        if args.bot == 'chase':
+            batch.step_chasing()
+        else:
+            batch.step(1, left[tick], right[tick])
+    elapsed = time.perf_counter() - start
+    game_ticks = args.games * args.ticks
+    print(f"{game_ticks:,} game-ticks in {elapsed:.2f}s ({game_ticks / elapsed:,.0f}/sec); "
+          f"mean score {batch.score.mean():.1f}, mean level {batch.level.mean():.2f}, "
+          f"{batch.game_over.sum()} of {args.games} games over")
+
+
+if __name__ == '__main__':
+    main()
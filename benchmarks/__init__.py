@@ -0,0 +1,4 @@
+"""Scripted performance scenarios for Game.update() and Game.draw().
+
+Run from the repository root with `python -m benchmarks.run`.
+"""
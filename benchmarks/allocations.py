@@ -0,0 +1,130 @@
+"""Check that drawing a frame allocates next to nothing once warmed up.
+
+    python -m benchmarks.allocations             # all cases, fail over budget
+    python -m benchmarks.allocations --case swarm
+
+benchmarks.run runs every case after its scenarios, so the regression
+check covers allocations too.
+
+Each case plays a game to a steady state, then traces draw() alone with
+tracemalloc for FRAMES frames. Two numbers per case are held to a budget:
+the Python memory draw() still holds after a frame, averaged over all the
+frames, and the most it holds at once during a frame beyond what was held
+before it, at the 95th percentile of frames. Pixel buffers come from SDL
+rather than Python and aren't traced, but every new Surface object is.
+Text is rendered when it changes, so the rare frame where the score or a
+timer changes allocates more, and a game that scores keeps adding a little
+to the first number, as the score's text is kept in the TextCache.
+Particles cost a few NumPy array views a frame however many there are,
+so that case has a budget of its own.
+"""
+import os
+
+# Draw to SDL's dummy display rather than a real window
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import argparse
+import sys
+import tracemalloc
+
+from headless import ChaseInput
+from main import POWERUP_DOUBLE_POINTS, POWERUP_HEALTH, YELLOW, Game, init_display
+from particles import ParticleSystem
+from profiler import percentile
+
+WARMUP_FRAMES = 300
+FRAMES = 600
+RETAINED_BUDGET = 64  # bytes per frame, on average
+TRANSIENT_BUDGET = 512  # bytes, at the 95th percentile frame
+PARTICLES_TRANSIENT_BUDGET = 4096  # bytes; the same for 50 particles as for 4000
+
+
+def notification(game):
+    game.newly_unlocked_powerups = [POWERUP_HEALTH, POWERUP_DOUBLE_POINTS]
+
+
+def game_over(game):
+    game.game_over = True
+
+
+CASES = {
+    'playing': {},
+    'notification': {'setup': notification},
+    'game_over': {'setup': game_over},
+    'swarm': {'swarm': True},
+    'dirty_rects': {'dirty_rects': True},
+    'fixed_resolution': {'render_size': (800, 600)},
+    'particles': {'particles': True, 'transient_budget': PARTICLES_TRANSIENT_BUDGET},
+}
+
+
+def measure(name, seed):
+    """(retained bytes per frame, p95 transient bytes) of draw() in one case."""
+    options = dict(CASES[name])
+    setup = options.pop('setup', None)
+    options.pop('transient_budget', None)
+    if options.pop('particles', False):
+        options['particles'] = ParticleSystem(seed=seed)
+    game = Game(init_display(), ChaseInput(), seed=seed, **options)
+    if setup is not None:
+        setup(game)
+
+    def frame():
+        if game.particles is not None and game.ticks % 10 == 0:
+            game.effect(game.width / 2, game.height / 2, 400, YELLOW, 300, 1.0)
+        game.update()
+        if game.game_over and setup is None:
+            game.reset_game()
+
+    for _ in range(WARMUP_FRAMES):
+        frame()
+        game.draw()
+
+    retained = 0
+    transient = []
+    tracemalloc.start()
+    try:
+        for _ in range(FRAMES):
+            frame()
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            game.draw()
+            current, peak = tracemalloc.get_traced_memory()
+            retained += current - before
+            transient.append(peak - before)
+    finally:
+        tracemalloc.stop()
+    transient.sort()
+    return retained / FRAMES, percentile(transient, 95)
+
+
+def check(names, seed):
+    """Measure the cases in `names`, printing each; returns those over budget."""
+    failed = []
+    for name in names:
+        retained, transient = measure(name, seed)
+        transient_budget = CASES[name].get('transient_budget', TRANSIENT_BUDGET)
+        over = retained > RETAINED_BUDGET or transient > transient_budget
+        print(f"{name}: {retained:.1f} bytes retained per frame, "
+              f"{transient:,} bytes transient (p95){'  OVER BUDGET' if over else ''}")
+        if over:
+            failed.append(name)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check draw() allocations per frame")
+    parser.add_argument('--case', action='append', choices=list(CASES),
+                        help="run only this case (can be repeated)")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    failed = check(args.case or CASES, args.seed)
+    if failed:
+        print(f"{len(failed)} cases over budget ({RETAINED_BUDGET} bytes retained per frame, "
+              f"{TRANSIENT_BUDGET:,} bytes transient at p95)")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Measure input-to-present latency with the two ways main() can pace frames.
+
+    python -m benchmarks.latency                  # both modes, 10 s each
+    python -m benchmarks.latency --seconds 30
+
+A thread presses and releases the arrow keys at random times, some of them
+taps shorter than a tick, by posting events to pygame's queue, each stamped
+with the moment it was posted. The game runs main()'s FrameLoop on SDL's
+dummy display, its keyboard taking those stamps instead of the time it polled
+the event, so latency runs from the real key change to the end of the
+first frame that drew it. The modes:
+
+    frame           clock.tick(FPS), then one poll; the browser build's pacing
+    just_in_time    sleep until the next tick is due, polling all the while
+
+Taps counts the short presses that moved the player on at least one tick.
+"""
+import os
+
+# Draw to SDL's dummy display rather than a real window
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import argparse
+import random
+import threading
+import time
+
+import pygame
+
+from inputs import MOVE_KEYS, BufferedKeyboardInput, InputState
+from main import FrameLoop, Game, init_display
+
+MODES = {'frame': False, 'just_in_time': True}
+TAP_MS = 5  # presses this short are taps
+
+
+class StampedKeyboardInput(BufferedKeyboardInput):
+    """Takes the time each key event was posted from its `sent` attribute,
+    and counts the ticks that moved the player."""
+    def __init__(self):
+        super().__init__()
+        self.moving_ticks = []  # perf_counter() start of each tick with a key held
+
+    def poll(self):
+        for event in pygame.event.get():
+            if event.type in (pygame.KEYDOWN, pygame.KEYUP) and event.key in MOVE_KEYS:
+                self.changes.append((event.sent, MOVE_KEYS[event.key], event.type == pygame.KEYDOWN))
+            self.events.append(event)
+
+    def read(self, game):
+        start = self.tick_start
+        keys = super().read(game)
+        if keys != InputState(False, False):
+            self.moving_ticks.append((start, self.tick_start))
+        return keys
+
+
+def press_keys(rng, stop, taps):
+    """Post arrow key presses and releases until `stop` is set, recording
+    the (down, up) times of taps."""
+    key = pygame.K_LEFT
+    while not stop.is_set():
+        time.sleep(rng.uniform(0.02, 0.25))
+        key = pygame.K_RIGHT if key == pygame.K_LEFT else pygame.K_LEFT
+        tap = rng.random() < 0.3
+        down = time.perf_counter()
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key, sent=down))
+        time.sleep(TAP_MS / 1000 * rng.random() if tap else rng.uniform(0.03, 0.3))
+        up = time.perf_counter()
+        pygame.event.post(pygame.event.Event(pygame.KEYUP, key=key, sent=up))
+        if tap:
+            taps.append((down, up))
+
+
+def play(just_in_time, seconds, seed):
+    """main()'s loop for `seconds`; returns the keyboard and the taps pressed."""
+    window = init_display()
+    keyboard = StampedKeyboardInput()
+    game = Game(window, keyboard, seed=seed)
+    stop = threading.Event()
+    taps = []
+    presser = threading.Thread(target=press_keys, args=(random.Random(seed), stop, taps))
+    presser.start()
+
+    frames = FrameLoop(game, keyboard, pygame.time.Clock(), just_in_time=just_in_time)
+    end = frames.last_frame + seconds
+    try:
+        while frames.last_frame < end:
+            frames.run_frame()
+            if game.game_over:
+                game.reset_game()
+    finally:
+        stop.set()
+        presser.join()
+    return keyboard, taps
+
+
+def registered(taps, moving_ticks):
+    """Taps that overlap a tick the player moved on."""
+    count = 0
+    for down, up in taps:
+        if any(start < up and down <= tick_end for start, tick_end in moving_ticks):
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure input-to-present latency")
+    parser.add_argument('--mode', action='append', choices=list(MODES),
+                        help="run only this mode (can be repeated)")
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    for name in args.mode or MODES:
+        keyboard, taps = play(MODES[name], args.seconds, args.seed)
+        summary = keyboard.latency_summary()
+        if not summary['changes']:
+            print(f"{name}: no key changes measured")
+            continue
+        print(f"{name}: {summary['changes']} key changes, latency p50 {summary['p50_ms']:.1f} ms, "
+              f"p95 {summary['p95_ms']:.1f} ms, max {summary['max_ms']:.1f} ms; "
+              f"{registered(taps, keyboard.moving_ticks)}/{len(taps)} taps registered")
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
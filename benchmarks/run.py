@@ -0,0 +1,208 @@
+"""Run the benchmark scenarios and compare them to the stored baseline.
+
+    python -m benchmarks.run                     # all scenarios, fail on regression
+    python -m benchmarks.run --scenario idle     # just one
+    python -m benchmarks.run --update-baseline   # record this machine's numbers
+    python -m benchmarks.run --no-allocations    # skip the draw() allocation check
+
+Every scenario is measured three ways: ticks/sec of update() alone without
+a window, update() plus draw() per frame on the dummy display, and peak
+Python memory (tracemalloc) while building the game and playing frames.
+Timings are the best of --repeat runs. The baseline is per machine: record
+one before changing update() or draw(), then compare after. A full run
+then checks draw() allocations against their budgets (see allocations.py),
+which hold on any machine, and that the run log stays bounded across
+sessions (see runlog.py).
+"""
+import os
+
+# Draw to SDL's dummy display rather than a real window
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from benchmarks import allocations, runlog
+from benchmarks.scenarios import SCENARIOS
+from main import Game, init_display
+from profiler import percentile
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# Reported metrics and whether higher is better
+METRICS = {
+    'ticks_per_sec': True,
+    'draw_ms': False,
+    'frame_p50_ms': False,
+    'frame_p95_ms': False,
+    'frame_p99_ms': False,
+    'peak_kib': False,
+}
+# The ones compared to the baseline; p50 and p99 are too noisy to gate on
+CHECKED = ('ticks_per_sec', 'draw_ms', 'frame_p95_ms', 'peak_kib')
+MEMORY_FRAMES = 120
+
+
+def new_game(scenario, window, seed):
+    game = Game(window, scenario.input_provider(random.Random(seed)), swarm=scenario.swarm,
+                seed=seed)
+    scenario.setup(game)
+    return game
+
+
+def advance(game, scenario, tick):
+    if scenario.script is not None:
+        scenario.script(game, tick)
+    game.update()
+    if game.game_over:
+        game.reset_game()
+        scenario.setup(game)
+
+
+def ticks_per_sec(scenario, seed):
+    game = new_game(scenario, None, seed)
+    warmup = scenario.ticks // 10
+    for tick in range(warmup):
+        advance(game, scenario, tick)
+    start = time.perf_counter()
+    for tick in range(warmup, warmup + scenario.ticks):
+        advance(game, scenario, tick)
+    return scenario.ticks / (time.perf_counter() - start)
+
+
+def frame_times(scenario, window, seed):
+    """(draw times, update + draw times) of every frame, in ms."""
+    game = new_game(scenario, window, seed)
+    draws = []
+    frames = []
+    for tick in range(scenario.frames):
+        start = time.perf_counter_ns()
+        advance(game, scenario, tick)
+        drawn = time.perf_counter_ns()
+        game.draw()
+        end = time.perf_counter_ns()
+        draws.append((end - drawn) / 1e6)
+        frames.append((end - start) / 1e6)
+    return draws, frames
+
+
+def peak_kib(scenario, window, seed):
+    tracemalloc.start()
+    try:
+        game = new_game(scenario, window, seed)
+        for tick in range(MEMORY_FRAMES):
+            advance(game, scenario, tick)
+            game.draw()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def measure(scenario, window, seed, repeat):
+    results = {'ticks_per_sec': max(ticks_per_sec(scenario, seed) for _ in range(repeat))}
+    best = None
+    for _ in range(repeat):
+        draws, frames = frame_times(scenario, window, seed)
+        if best is None or sum(frames) < sum(best[1]):
+            best = draws, frames
+    draws, frames = best
+    frames.sort()
+    results['draw_ms'] = sum(draws) / len(draws)
+    for p in (50, 95, 99):
+        results[f'frame_p{p}_ms'] = percentile(frames, p)
+    results['peak_kib'] = peak_kib(scenario, window, seed)
+    return results
+
+
+def regressions(results, baseline, threshold):
+    """Metrics worse than the baseline by more than `threshold` (a fraction)."""
+    failed = []
+    for name in CHECKED:
+        if name not in baseline:
+            continue
+        value, base = results[name], baseline[name]
+        if METRICS[name]:
+            worse = value < base * (1 - threshold)
+        else:
+            worse = value > base * (1 + threshold)
+        if worse:
+            failed.append(name)
+    return failed
+
+
+def format_metrics(results, baseline=None):
+    parts = []
+    for name, value in results.items():
+        text = f"{name} {value:,.0f}" if value >= 100 else f"{name} {value:.3f}"
+        if baseline and name in baseline and baseline[name]:
+            text += f" ({(value / baseline[name] - 1) * 100:+.0f}%)"
+        parts.append(text)
+    return ', '.join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Coin Collector scenarios")
+    parser.add_argument('--scenario', action='append', choices=[s.name for s in SCENARIOS],
+                        help="run only this scenario (can be repeated)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3, help="timing runs per scenario")
+    parser.add_argument('--threshold', type=float, default=0.3,
+                        help="fail when a metric is this fraction worse than the baseline")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="store the results as the new baseline instead of comparing")
+    parser.add_argument('--no-allocations', action='store_true',
+                        help="skip the draw() allocation check")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    scenarios = [s for s in SCENARIOS if not args.scenario or s.name in args.scenario]
+    failed = {}
+    for scenario in scenarios:
+        # A fresh window each time: scenarios can resize or fullscreen it
+        window = init_display()
+        results = measure(scenario, window, args.seed, args.repeat)
+        print(f"{scenario.name} ({scenario.description}):")
+        print(f"  {format_metrics(results, baseline.get(scenario.name))}")
+        if args.update_baseline:
+            baseline[scenario.name] = results
+        elif scenario.name in baseline:
+            worse = regressions(results, baseline[scenario.name], args.threshold)
+            if worse:
+                failed[scenario.name] = worse
+                print(f"  REGRESSED: {', '.join(worse)}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"baseline written to {args.baseline}")
+        return
+    if failed:
+        print(f"{len(failed)} of {len(scenarios)} scenarios regressed by more than "
+              f"{args.threshold:.0%}")
+
+    over_budget = []
+    if not args.scenario and not args.no_allocations:
+        print("draw() allocations:")
+        over_budget = allocations.check(allocations.CASES, args.seed)
+        if over_budget:
+            print(f"{len(over_budget)} allocation cases over budget")
+    unbounded = []
+    if not args.scenario:
+        print("run log across sessions:")
+        unbounded = runlog.check(300, 10, args.seed)
+    if failed or over_budget or unbounded:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
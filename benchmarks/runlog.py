@@ -0,0 +1,101 @@
+"""Check that the run log stays bounded when it's reopened session after session.
+
+    python -m benchmarks.runlog                        # 300 sessions of 10 runs
+    python -m benchmarks.runlog --sessions 50 --runs 40
+
+Each session opens the log as main() does, adds its runs and closes it:
+once on a FileStore with a ThreadWriter, as on the desktop, and once on a
+BrowserStore with an AsyncWriter, as in the web build, over a dict
+standing in for localStorage. However few runs a session adds, the log
+must never hold more than TOP_SIZE + KEEP_RECENT runs plus one session's
+worth (COMPACT_EVERY at most), and the high score table must still be the
+best TOP_SIZE runs of them all.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+
+from telemetry import (COMPACT_EVERY, KEEP_RECENT, TOP_SIZE, AsyncWriter, BrowserStore,
+                       FileStore, RunLog, ThreadWriter, score_key)
+
+
+class MemoryStorage:
+    """The two localStorage methods BrowserStore uses, over a dict."""
+    def __init__(self):
+        self.items = {}
+
+    def getItem(self, key):
+        return self.items.get(key)
+
+    def setItem(self, key, value):
+        self.items[key] = value
+
+
+def run_record(rng, number):
+    return {'time': number, 'ending': 'game_over', 'score': rng.randrange(5000),
+            'level': rng.randrange(1, 30), 'seconds': 60.0, 'damage': 3,
+            'power_ups': {}, 'frame_ms': {'frames': 0}}
+
+
+async def play_sessions(open_store, writer_class, sessions, runs, seed):
+    """Returns the most lines the log held after a session, and whether the
+    final high score table is right."""
+    rng = random.Random(seed)
+    every_run = []
+    longest = 0
+    for _ in range(sessions):
+        store = open_store()
+        log = RunLog(store, writer_class)
+        for _ in range(runs):
+            record = run_record(rng, len(every_run))
+            dropped = log.dropped
+            log.add(record)
+            if log.dropped == dropped:  # a full queue drops it from the log by design
+                every_run.append(record)
+        await log.close()
+        if log.writer.error is not None:
+            raise log.writer.error
+        longest = max(longest, len(open_store().load()))
+    log = RunLog(open_store(), writer_class)
+    await log.close()
+    best = sorted(every_run, key=score_key)[:TOP_SIZE]
+    return longest, log.top(TOP_SIZE) == best
+
+
+def check(sessions, runs, seed):
+    """Play the sessions on both stores, printing each; returns those that failed."""
+    limit = TOP_SIZE + KEEP_RECENT + min(runs, COMPACT_EVERY)
+    failed = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'runs.jsonl')
+        storage = MemoryStorage()
+        stores = {'file': (lambda: FileStore(path), ThreadWriter),
+                  'browser': (lambda: BrowserStore(storage=storage), AsyncWriter)}
+        for name, (open_store, writer_class) in stores.items():
+            longest, table_right = asyncio.run(
+                play_sessions(open_store, writer_class, sessions, runs, seed))
+            bad = longest > limit or not table_right
+            print(f"{name}: {sessions} sessions of {runs} runs, at most {longest} lines "
+                  f"(limit {limit}), high scores {'right' if table_right else 'WRONG'}"
+                  f"{'  FAILED' if bad else ''}")
+            if bad:
+                failed.append(name)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the run log stays bounded across sessions")
+    parser.add_argument('--sessions', type=int, default=300)
+    parser.add_argument('--runs', type=int, default=10, help="runs logged per session")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if check(args.sessions, args.runs, args.seed):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
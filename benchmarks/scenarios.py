@@ -0,0 +1,102 @@
+"""The benchmark scenarios.
+
+Each scenario puts a fresh Game into the state to measure and can script
+it tick by tick. Games are seeded by the runner, so every run of a
+scenario plays out the same way.
+"""
+from main import (POWERUP_DOUBLE_POINTS, POWERUP_INVINCIBLE, POWERUP_SLOW_OBSTACLES, YELLOW,
+                  InputProvider, PowerUp)
+from headless import RandomInput
+from particles import ParticleSystem
+
+
+class Scenario:
+    """A scripted game.
+
+    `setup(game)` runs on the new game, and again whenever it ends, since a
+    game that's over does no work. `script(game, tick)`, if given, runs
+    before every tick. `ticks` is the length of the update-only run and
+    `frames` of the update-and-draw run.
+    """
+    def __init__(self, name, description, setup, script=None, idle=False, swarm=False,
+                 ticks=20000, frames=600):
+        self.name = name
+        self.description = description
+        self.setup = setup
+        self.script = script
+        self.idle = idle
+        self.swarm = swarm
+        self.ticks = ticks
+        self.frames = frames
+
+    def input_provider(self, rng):
+        return InputProvider() if self.idle else RandomInput(rng)
+
+
+def advance_to_level(game, level):
+    while game.level < level:
+        game.advance_level()
+    # Unlock notifications force full redraws for seconds; measure without them
+    game.newly_unlocked_powerups = []
+
+
+def no_setup(game):
+    pass
+
+
+def level_20(game):
+    advance_to_level(game, 20)
+
+
+def all_power_ups(game):
+    advance_to_level(game, 7)
+    for power_up_type in (POWERUP_INVINCIBLE, POWERUP_DOUBLE_POINTS, POWERUP_SLOW_OBSTACLES):
+        power_up = PowerUp(0, 0, power_up_type)
+        power_up.duration = 10 ** 6  # outlasts the run
+        game.apply_power_up(power_up)
+
+
+def keep_power_ups_falling(game, tick):
+    # Far more often than the 0.5% spawn chance, so a few are always on screen
+    if tick % 30 == 0:
+        game.add_power_up(game.create_power_up())
+
+
+RESIZE_SIZES = [(800, 600), (1024, 768), (640, 480), (1280, 720), (960, 540)]
+
+
+def resize_storm(game, tick):
+    if tick % 60 == 0:
+        game.toggle_fullscreen()
+    elif tick % 6 == 0 and not game.fullscreen:
+        game.handle_resize(RESIZE_SIZES[tick // 6 % len(RESIZE_SIZES)])
+
+
+def stress_level(game):
+    # Level 12 is the first with both coin and obstacle counts at their caps
+    advance_to_level(game, 12)
+
+
+def attach_particles(game):
+    if game.particles is None:
+        game.particles = ParticleSystem(seed=0)
+
+
+def keep_particles_flying(game, tick):
+    # 800 every 10 ticks, each living about a second: around 3000 alive at once
+    if tick % 10 == 0:
+        game.effect(game.width / 2, game.height / 2, 800, YELLOW, 300, 1.0, rise=150)
+
+
+SCENARIOS = [
+    Scenario('idle', "level 1, no input", no_setup, idle=True),
+    Scenario('level_20', "level 20 with the most coins and obstacles", level_20),
+    Scenario('power_ups', "every timed power-up active, power-ups falling",
+             all_power_ups, keep_power_ups_falling),
+    Scenario('resize_storm', "a resize every 6 ticks, fullscreen toggled every 60",
+             no_setup, resize_storm, ticks=2000, frames=300),
+    Scenario('stress', "swarm mode at level 12", stress_level, swarm=True,
+             ticks=1000, frames=100),
+    Scenario('particles', "thousands of particles in flight", attach_particles,
+             keep_particles_flying),
+]
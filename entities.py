@@ -0,0 +1,59 @@
+"""Compact storage for the game's falling objects."""
+
+
+class Entity:
+    """A coin or an obstacle.
+
+    `index` is its position in the owning pool and `cell` its spatial-hash
+    cell, both kept up to date by their owners.
+    """
+    __slots__ = ('x', 'y', 'index', 'cell')
+
+
+class EntityPool:
+    """Live entities in a dense list, with released records kept for reuse.
+
+    Removal swaps the last entity into the hole, so it is O(1) but doesn't
+    keep order; every entity's `index` follows it. Anything with `index` and
+    `cell` slots can be stored; spawn() and release() recycle Entity records
+    so steady-state respawning allocates nothing.
+    """
+    def __init__(self):
+        self.active = []
+        self.free = []
+
+    def __len__(self):
+        return len(self.active)
+
+    def __iter__(self):
+        return iter(self.active)
+
+    def __getitem__(self, index):
+        return self.active[index]
+
+    def add(self, entity):
+        entity.index = len(self.active)
+        entity.cell = None
+        self.active.append(entity)
+        return entity
+
+    def remove(self, entity):
+        active = self.active
+        last = active.pop()
+        if last is not entity:
+            active[entity.index] = last
+            last.index = entity.index
+
+    def spawn(self, x, y):
+        entity = self.free.pop() if self.free else Entity()
+        entity.x = x
+        entity.y = y
+        return self.add(entity)
+
+    def release(self, entity):
+        self.remove(entity)
+        self.free.append(entity)
+
+    def clear(self):
+        self.free.extend(entity for entity in self.active if type(entity) is Entity)
+        self.active.clear()
@@ -0,0 +1,76 @@
+"""Trade drawing quality for frame rate when frames run over budget.
+
+The loop in main() reports how long each drawn frame took. When the slow
+frames of the last `window` go over the budget, quality drops one level;
+after a long enough stretch with plenty of headroom, it comes back one
+level. Levels are cumulative, each one dropping a little more:
+
+    FULL            everything
+    NO_OVERLAYS     no translucent backgrounds behind notifications and game over
+    SIMPLE_SHAPES   coins and power-ups drawn as plain squares, no particles
+    SLOW_HUD        HUD text laid out every Game.hud_interval frames
+    SKIP_FRAMES     every other frame isn't drawn; the game keeps ticking
+
+Only drawing changes: the simulation, and so replays, are the same at any
+level.
+"""
+from collections import deque
+
+from profiler import percentile
+
+FULL, NO_OVERLAYS, SIMPLE_SHAPES, SLOW_HUD, SKIP_FRAMES = range(5)
+LEVEL_NAMES = ('full', 'no overlays', 'simple shapes', 'slow HUD', 'skip frames')
+
+
+class QualityGovernor:
+    """Picks a quality level from recent frame times.
+
+    A level holds for at least `window` frames, so the frames that judge it
+    were all drawn at it. A step back up needs `recover_frames` frames with
+    the slow ones under `headroom` of the budget; when quality has to drop
+    again soon after coming up, the next recovery waits twice as long, so
+    a game right at the edge settles instead of flickering between levels.
+    """
+    def __init__(self, budget_ms, window=30, recover_frames=180, headroom=0.7):
+        self.budget_ms = budget_ms
+        self.headroom = headroom
+        self.samples = deque(maxlen=window)
+        self.base_recover_frames = recover_frames
+        self.recover_frames = recover_frames
+        self.level = FULL
+        self.frames_at_level = 0
+        self.raised = False  # the last change was a step back up
+        self.frame = 0
+
+    def should_draw(self):
+        """Whether to draw this frame; call once per frame."""
+        self.frame += 1
+        return self.level < SKIP_FRAMES or self.frame % 2 == 0
+
+    def record(self, frame_ms):
+        """Feed the time of one drawn frame; returns True if the level changed."""
+        samples = self.samples
+        samples.append(frame_ms)
+        self.frames_at_level += 1
+        if len(samples) < samples.maxlen:
+            return False
+
+        slow = percentile(sorted(samples), 90)
+        if slow > self.budget_ms and self.level < SKIP_FRAMES:
+            if self.raised and self.frames_at_level < 2 * self.recover_frames:
+                self.recover_frames = min(self.recover_frames * 2, 16 * self.base_recover_frames)
+            self._set_level(self.level + 1, raised=False)
+            return True
+        if (slow < self.budget_ms * self.headroom and self.level > FULL
+                and self.frames_at_level >= self.recover_frames):
+            self._set_level(self.level - 1, raised=True)
+            return True
+        if self.level == FULL and self.frames_at_level >= 4 * self.recover_frames:
+            self.recover_frames = self.base_recover_frames  # settled at full quality
+        return False
+
+    def _set_level(self, level, raised):
+        self.level = level
+        self.raised = raised
+        self.frames_at_level = 0
+        self.samples.clear()
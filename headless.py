@@ -0,0 +1,90 @@
+"""Run the Coin Collector simulation without a window.
+
+Used for balancing runs and CI: the game logic is stepped as fast as the CPU
+allows, with input coming from an InputProvider instead of the keyboard.
+
+    python headless.py --ticks 100000 --seed 1
+"""
+import argparse
+import random
+import time
+
+from inputs import InputProvider, InputState
+from main import Game
+from replay import Recorder
+
+
+class RandomInput(InputProvider):
+    """Holds a random direction for a random number of ticks."""
+    def __init__(self, rng=None):
+        self.rng = rng or random.Random()
+        self.current = InputState(False, False)
+        self.hold = 0
+
+    def read(self, game):
+        if self.hold <= 0:
+            direction = self.rng.randint(-1, 1)
+            self.current = InputState(direction < 0, direction > 0)
+            self.hold = self.rng.randint(5, 60)
+        self.hold -= 1
+        return self.current
+
+
+class ChaseInput(InputProvider):
+    """Steers toward the lowest coin on screen and ignores everything else."""
+    def read(self, game):
+        coin = max(game.coins, key=lambda c: c.y)
+        target = coin.x + game.coin_size / 2
+        center = game.player_x + game.player_size / 2
+        step = game.player_speed * game.dt
+        return InputState(target < center - step, target > center + step)
+
+
+def run(ticks, input_provider=None, restart=True, swarm=False, seed=None, record=None):
+    """Simulate `ticks` ticks, restarting after each game over if `restart`.
+
+    With `record`, the run is saved there as a replay (see replay.py).
+    Returns (game, games_played).
+    """
+    game = Game(input_provider=input_provider, swarm=swarm, seed=seed)
+    recorder = Recorder(game) if record else None
+    games_played = 1
+    remaining = ticks
+    while remaining > 0:
+        remaining -= game.step(remaining)
+        if game.game_over:
+            if not restart:
+                break
+            game.reset_game()
+            games_played += 1
+    if recorder is not None:
+        recorder.save(record)
+    return game, games_played
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Coin Collector headless")
+    parser.add_argument('--ticks', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--input', choices=['idle', 'random', 'chase'], default='random')
+    parser.add_argument('--swarm', action='store_true', help="run with swarm-mode entity counts")
+    parser.add_argument('--record', metavar='PATH', help="save the run as a replay")
+    args = parser.parse_args()
+
+    input_provider = {
+        'idle': None,
+        'random': RandomInput(random.Random(args.seed)),
+        'chase': ChaseInput(),
+    }[args.input]
+
+    start = time.perf_counter()
+    game, games_played = run(args.ticks, input_provider, swarm=args.swarm, seed=args.seed,
+                             record=args.record)
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.ticks} ticks in {elapsed:.3f}s ({args.ticks / elapsed:,.0f} ticks/sec), "
+          f"{games_played} games, last score {game.score} at level {game.level}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Player input, supplied to Game.update() one tick at a time."""
+import time
+from array import array
+from collections import deque, namedtuple
+
+import pygame
+
+from profiler import percentile
+
+# Player input for a single tick
+InputState = namedtuple('InputState', ['left', 'right'])
+NO_INPUT = InputState(False, False)
+
+# Keys that move the player, by their place in BufferedKeyboardInput.held
+MOVE_KEYS = {pygame.K_LEFT: 0, pygame.K_RIGHT: 1}
+
+class InputProvider:
+    """Supplies the player's input to Game.update(), one tick at a time.
+
+    The base provider never presses anything; subclasses read a keyboard,
+    a script or a bot. read() gets the game so bots can look at its state.
+    """
+    def read(self, game):
+        return NO_INPUT
+
+class KeyboardInput(InputProvider):
+    def read(self, game):
+        keys = pygame.key.get_pressed()
+        return InputState(keys[pygame.K_LEFT], keys[pygame.K_RIGHT])
+
+class BufferedKeyboardInput(InputProvider):
+    """Keyboard input from timestamped key events, sliced tick by tick.
+
+    The loop drains pygame's event queue through poll(), or wait(), which
+    polls while it sleeps. Arrow key presses and releases are stamped with
+    the time they were seen, and every event is kept for Game.handle_events()
+    to get from take_events(). Before a frame's ticks run, start_ticks() is
+    told when the first of them begins; each read() then covers the next
+    tick's worth of real time, and a key counts as held on a tick if it was
+    down at any point during it. Ticks run in the same frame each see their
+    own slice of the input, and a tap shorter than a frame still moves the
+    player for a tick.
+
+    Latency runs from when a press or release was seen to presented(), the
+    end of the first frame that drew the tick it was used on. The last
+    `capacity` measurements are kept.
+    """
+    def __init__(self, poll_interval=0.001, capacity=600):
+        self.poll_interval = poll_interval  # seconds between polls in wait()
+        self.events = []
+        self.changes = deque()  # (perf_counter() seen, key index, down), oldest first
+        self.held = [False, False]  # left, right, after the changes used so far
+        self.tick_start = 0.0  # perf_counter() time the next read() starts at
+        self.unpresented = []  # seen times of changes used by ticks not yet drawn
+        self.capacity = capacity
+        self.latencies = array('d', bytes(8 * capacity))  # ms, a ring buffer
+        self.measured = 0  # latencies measured, including ones the buffer has dropped
+
+    def poll(self):
+        now = time.perf_counter()
+        for event in pygame.event.get():
+            if event.type in (pygame.KEYDOWN, pygame.KEYUP) and event.key in MOVE_KEYS:
+                self.changes.append((now, MOVE_KEYS[event.key], event.type == pygame.KEYDOWN))
+            self.events.append(event)
+
+    def wait(self, until):
+        """Sleep until perf_counter() reaches `until`, polling all the while."""
+        while True:
+            self.poll()
+            remaining = until - time.perf_counter()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, self.poll_interval))
+
+    def take_events(self):
+        """The events polled since the last call, for Game.handle_events()."""
+        events = self.events
+        self.events = []
+        return events
+
+    def start_ticks(self, start):
+        """Set the perf_counter() time the next tick begins at. Changes from
+        before it that no tick covered, as while paused, only update what's held."""
+        changes, held = self.changes, self.held
+        while changes and changes[0][0] <= start:
+            _, key, down = changes.popleft()
+            held[key] = down
+        self.tick_start = start
+
+    def read(self, game):
+        end = self.tick_start + game.tick_ms / 1000
+        changes, held = self.changes, self.held
+        left, right = held
+        while changes and changes[0][0] <= end:
+            seen, key, down = changes.popleft()
+            held[key] = down
+            if down:
+                if key:
+                    right = True
+                else:
+                    left = True
+            self.unpresented.append(seen)
+        self.tick_start = end
+        return InputState(left, right)
+
+    def presented(self):
+        """Call when a frame has been presented, to measure the latency of
+        the input its ticks used."""
+        if not self.unpresented:
+            return
+        now = time.perf_counter()
+        for seen in self.unpresented:
+            self.latencies[self.measured % self.capacity] = (now - seen) * 1000
+            self.measured += 1
+        self.unpresented.clear()
+
+    def latency_summary(self):
+        """p50/p95/max input-to-present latency in ms over the kept measurements."""
+        latencies = sorted(self.latencies[:min(self.measured, self.capacity)])
+        if not latencies:
+            return {'changes': 0}
+        return {'changes': len(latencies), 'p50_ms': percentile(latencies, 50),
+                'p95_ms': percentile(latencies, 95), 'max_ms': latencies[-1]}
@@ -1,15 +1,22 @@
+import time
+STARTED = time.perf_counter()  # cold-start time is measured from here
+
 import pygame
 import random
-import time
+import sys
 import asyncio  # Add asyncio import
-
-# Initialize Pygame
-pygame.init()
-
-# Get the current screen info
-screen_info = pygame.display.Info()
-DESKTOP_WIDTH = screen_info.current_w
-DESKTOP_HEIGHT = screen_info.current_h
+from operator import attrgetter
+
+from entities import EntityPool
+from governor import FULL, NO_OVERLAYS, SIMPLE_SHAPES, SLOW_HUD, QualityGovernor
+from inputs import BufferedKeyboardInput, InputProvider, KeyboardInput
+from profiler import FrameProfiler, NullProfiler
+from replay import Recorder
+from render import SpriteAtlas, TextCache
+from scheduler import Scheduler
+from spatial import SpatialHash
+from spawns import SpawnDirector
+from telemetry import RunLog, Telemetry
 
 # Base resolution (for scaling calculations)
 BASE_WIDTH = 800
@@ -19,14 +26,47 @@ BASE_HEIGHT = 600
 WIDTH = BASE_WIDTH
 HEIGHT = BASE_HEIGHT
 
-# Create resizable window
-window = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE)
-pygame.display.set_caption("Coin Collector")
-
 # Scale factor for game objects
 scale_x = 1.0
 scale_y = 1.0
 
+# Simulation clock: every call to Game.update() advances the game by one
+# fixed tick, independent of how fast frames are drawn
+TICK_RATE = 60
+
+# Rendering
+FPS = 60
+DIRTY_RECTS = False  # present only changed areas instead of the whole window (F9)
+# Fixed internal resolution, e.g. (BASE_WIDTH, BASE_HEIGHT): the game is
+# simulated and drawn at this size whatever the window's size, and scaled
+# to the window once per frame. None draws at the window's own size.
+RENDER_SIZE = None
+SMOOTH_SCALE = False  # smoothscale() instead of scale() for the fixed resolution
+MAX_FRAME_MS = 250  # longest frame the simulation catches up on
+QUALITY_GOVERNOR = True  # lower drawing quality step by step when frames run over budget
+# Sleep until the next tick is due, polling the keyboard, rather than to a
+# steady FPS. Frames then follow the tick rate. The browser decides when
+# frames run, so there it's always FPS.
+JUST_IN_TIME_INPUT = sys.platform != 'emscripten'
+PARTICLES = True  # pickup, hit and power-up effects; they need NumPy
+
+# Frame profiling: the overlay is toggled with F3. Set to a .csv or .json
+# path to save the recorded frame timings when the game exits.
+PROFILE_EXPORT = None
+
+# Set to a path to record the session's input there on exit, for replay.py
+RECORD_REPLAY = None
+
+# Every run's stats and the high score table are kept here (in localStorage
+# in the web build); see telemetry.py. None keeps nothing.
+RUN_LOG = 'coin_collector_runs.jsonl'
+HIGH_SCORES_SHOWN = 5  # on the game over screen
+
+# Swarm mode multiplies coin and obstacle counts, for stress and balancing runs
+SWARM_MODE = False
+SWARM_MULTIPLIER = 200
+BROADPHASE_MIN = 32  # entities of a kind below which a grid query costs more than a scan
+
 # Colors
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
@@ -45,7 +85,40 @@ POWERUP_DOUBLE_POINTS = 'double_points'
 POWERUP_HEALTH = 'health'
 POWERUP_SLOW_OBSTACLES = 'slow_obstacles'
 
+# Game attributes Game.snapshot() saves as they are: the plain values that
+# update() reads or changes. Entities, timers and the RNG are saved apart.
+SNAPSHOT_ATTRIBUTES = (
+    'ticks', 'game_over', 'score', 'level', 'coins_collected_this_level',
+    'player_x', 'prev_player_x', 'player_y', 'current_health',
+    'invulnerable', 'invulnerable_until', 'flashing', 'flash_on', 'player_color',
+    'coin_speed', 'obstacle_speed', 'original_obstacle_speed', 'notification_start',
+)
+snapshot_attributes = attrgetter(*SNAPSHOT_ATTRIBUTES)
+position = attrgetter('x', 'y')
+
+def init_display(size=(WIDTH, HEIGHT), caption="Coin Collector"):
+    """Start the display and font subsystems and open the window.
+
+    Nothing else in pygame is initialized: the game has no sound, and
+    importing this module opens nothing, so headless runs never touch
+    the display.
+    """
+    pygame.display.init()
+    pygame.font.init()
+    window = pygame.display.set_mode(size, pygame.RESIZABLE)
+    pygame.display.set_caption(caption)
+    return window
+
+def desktop_size():
+    """The size fullscreen switches to; the base size when there is no display."""
+    if pygame.display.get_init():
+        return pygame.display.get_desktop_sizes()[0]
+    return BASE_WIDTH, BASE_HEIGHT
+
 class PowerUp:
+    __slots__ = ('x', 'y', 'type', 'base_size', 'size', 'active', 'start_time', 'duration',
+                 'color', 'index', 'cell')
+
     def __init__(self, x, y, type):
         self.x = x
         self.y = y
@@ -66,26 +139,61 @@ class PowerUp:
     def scale(self, scale_x, scale_y):
         self.size = int(self.base_size * min(scale_x, scale_y))
 
-    def is_expired(self):
-        if self.type == POWERUP_HEALTH:
-            return True
-        return time.time() - self.start_time > self.duration if self.active else False
-
-    def activate(self):
+    # All times are in milliseconds of game clock (see Game.time_ms).
+    # Expiry is scheduled by Game.apply_power_up().
+    def activate(self, now):
         self.active = True
-        self.start_time = time.time()
+        self.start_time = now
 
-    def time_remaining(self):
+    def time_remaining(self, now):
         if not self.active:
             return 0
-        return max(0, self.duration - (time.time() - self.start_time))
+        return max(0, self.duration - (now - self.start_time) / 1000)
 
 class Game:
-    def __init__(self):
-        # Screen settings
+    def __init__(self, window=None, input_provider=None, width=WIDTH, height=HEIGHT,
+                 tick_rate=TICK_RATE, dirty_rects=DIRTY_RECTS, swarm=SWARM_MODE, profiler=None,
+                 seed=None, render_size=RENDER_SIZE, smooth_scale=SMOOTH_SCALE, particles=None):
+        # Screen settings. Without a window the game runs headless: the
+        # simulation works the same but nothing is drawn or resized on screen.
+        self.window = window
         self.fullscreen = False
-        self.width = WIDTH
-        self.height = HEIGHT
+        self.width = width
+        self.height = height
+
+        # With a render size the game keeps that size and is drawn to an
+        # offscreen canvas, which is scaled into `viewport` (the largest area
+        # of the window with the canvas's aspect ratio) to present it.
+        # Otherwise the screen is the window and the game follows its size.
+        self.render_size = render_size
+        if render_size is not None:
+            self.width, self.height = render_size
+        self.smooth_scale = smooth_scale
+        self.screen = None
+        self.viewport = None
+        self.pending_size = None  # window size of a resize burst in progress
+
+        # Input settings
+        if input_provider is None:
+            input_provider = KeyboardInput() if window is not None else InputProvider()
+        self.input_provider = input_provider
+
+        # Game clock, counted in fixed ticks. Every timer reads time_ms.
+        self.tick_rate = tick_rate
+        self.tick_ms = 1000 / tick_rate
+        self.dt = 1 / tick_rate
+        self.ticks = 0
+
+        # Every random draw the simulation makes comes from this generator,
+        # so a seed and the input replay a game exactly (see replay.py)
+        self.seed = seed if seed is not None else random.getrandbits(64)
+        self.rng = random.Random(self.seed)
+
+        # Set by replay.Recorder to log window events along with the input
+        self.recorder = None
+
+        # Set by telemetry.Telemetry to log each run's stats when it ends
+        self.telemetry = None
 
         # Base sizes (for scaling)
         self.base_player_size = 50
@@ -97,13 +205,17 @@ class Game:
         self.player_size = self.base_player_size
         self.player_x = self.width // 2 - self.player_size // 2
         self.player_y = self.height - self.player_size - 10
-        self.base_player_speed = 5
+        self.base_player_speed = 300  # pixels per second, like all speeds
         self.player_speed = self.base_player_speed
+        self.prev_player_x = self.player_x  # position at the previous tick, for drawing
         self.max_health = 5
         self.current_health = self.max_health
         self.invulnerable = False
-        self.invulnerable_timer = 0
+        self.invulnerable_until = 0  # tick
         self.invulnerable_duration = 1500
+        self.flash_interval = 200  # the player flashes while invulnerable or invincible
+        self.flashing = False
+        self.flash_on = False
         self.player_color = WHITE
 
         # Power-up unlock levels
@@ -117,30 +229,53 @@ class Game:
         # Notification settings
         self.newly_unlocked_powerups = []
         self.notification_duration = 5000  # 5 seconds
-        self.notification_start = 0
+        self.notification_start = 0  # tick
+
+        # Timed events (power-up expiry, end of invulnerability, flashing,
+        # notification dismissal), due on game ticks. The game clock only
+        # runs in update(), so timers stop while the game is paused.
+        self.timers = Scheduler()
+        self.paused = False
+        self.auto_paused = False  # paused because the window was minimized
+
+        # Entity counts, which grow with the level up to a cap
+        self.swarm = swarm
+        self.entity_multiplier = SWARM_MULTIPLIER if swarm else 1
+        self.max_coins = 3 * self.entity_multiplier
+        self.max_obstacles = 3 * self.entity_multiplier
 
         # Level settings
         self.level = 1
-        self.coins_for_next_level = 10
+        self.coins_for_next_level = 10 * self.entity_multiplier
         self.coins_collected_this_level = 0
         self.level_multiplier = 1.2
 
+        # Broadphase grids for collisions against the player. With the handful
+        # of entities of a normal game, checking them all is cheaper.
+        self.coin_grid = SpatialHash() if swarm else None
+        self.obstacle_grid = SpatialHash() if swarm else None
+        self.power_up_grid = SpatialHash() if swarm else None
+
         # Coin settings
         self.coin_size = self.base_coin_size
-        self.base_coin_speed = 3
+        self.base_coin_speed = 180
         self.coin_speed = self.base_coin_speed
-        self.coins = [self.create_coin()]
+        self.coins = EntityPool()
+        for _ in range(self.entity_multiplier):
+            self.create_coin()
 
         # Obstacle settings
         self.obstacle_size = self.base_obstacle_size
-        self.base_obstacle_speed = 4
+        self.base_obstacle_speed = 240
         self.obstacle_speed = self.base_obstacle_speed
         self.original_obstacle_speed = self.obstacle_speed
-        self.obstacles = [self.create_obstacle()]
+        self.obstacles = EntityPool()
+        for _ in range(self.entity_multiplier):
+            self.create_obstacle()
 
         # Power-up settings
-        self.power_ups = []
-        self.base_power_up_speed = 2
+        self.power_ups = EntityPool()
+        self.base_power_up_speed = 120
         self.power_up_speed = self.base_power_up_speed
         self.power_up_spawn_chance = 0.005  # Reduced from 0.02 to 0.005 (0.5% chance)
         self.active_power_ups = {
@@ -149,6 +284,60 @@ class Game:
             POWERUP_SLOW_OBSTACLES: None
         }
 
+        # Per-level spawn rules, compiled from the settings above when a
+        # level is first played. The level's spawns start on the next tick.
+        self.spawns = SpawnDirector(self)
+        self.timers.schedule(self.ticks + 1, 'start_spawns', self.level)
+
+        # Rendered HUD text and entity sprites, rebuilt when the scale changes
+        self.text_cache = TextCache()
+        self.sprites = SpriteAtlas()
+
+        # Static layer under everything: black, bar backgrounds and the level
+        # label. Rebuilt on resize or level change.
+        self.background = None
+        self.background_level = None
+
+        # Translucent backgrounds of the game over screen and the unlock
+        # notifications, built once per size (see build_overlays)
+        self.game_over_overlay = None
+        self.notification_bg = None
+        self.notification_area = None
+
+        # Buffers reused by every frame so steady-state drawing allocates next
+        # to nothing: [sprite, area] pairs for blits(), with the areas in two
+        # sets of Rects used on alternate frames so last frame's are still
+        # there to erase; spare Rects for when there are more entities again;
+        # and, in dirty-rect mode, the areas drawn this frame and last frame
+        # and the two together for presenting
+        self.entity_blits = []
+        self.entity_areas = ([], [])
+        self.spare_areas = []
+        self.rects = []
+        self.presented_rects = []
+
+        # Dirty-rect rendering: areas drawn last frame, erased from the
+        # background and presented together with this frame's areas
+        self.dirty_rects = dirty_rects
+        self.previous_rects = []
+        self.full_redraw = True
+
+        # Drawing quality, set by the governor in main() (see governor.py).
+        # From SLOW_HUD the HUD's fills and blits are laid out every
+        # `hud_interval` frames and repeated in between.
+        self.quality = FULL
+        self.hud_interval = 10
+        self.hud = None  # (fills, blits) of the last HUD layout
+        self.hud_shown = [None] * 5  # what it showed when it was laid out (see hud_changed)
+        self.frames_drawn = 0
+
+        # Per-phase timings of update() and draw()
+        self.profiler = profiler if profiler is not None else NullProfiler()
+
+        # Pickup, hit and power-up effects (a particles.ParticleSystem), if any.
+        # They are only drawn, so the simulation is the same without them.
+        self.particles = particles
+
         # Initialize sizes
         self.update_scale_factors()
 
@@ -156,6 +345,14 @@ class Game:
         self.game_over = False
         self.score = 0
 
+    @property
+    def time_ms(self):
+        return self.ticks * self.tick_ms
+
+    def ticks_for(self, ms):
+        """Whole ticks covering a duration in milliseconds, at least one."""
+        return max(1, round(ms / self.tick_ms))
+
     def update_scale_factors(self):
         global scale_x, scale_y
         scale_x = self.width / BASE_WIDTH
@@ -170,91 +367,176 @@ class Game:
         self.obstacle_speed = self.base_obstacle_speed * min(scale_x, scale_y)
         self.power_up_speed = self.base_power_up_speed * min(scale_x, scale_y)
 
-        # Update power-up sizes
+        # Update power-up sizes. Ones spawned before the next rescale are at
+        # base size, so collision queries reach for the larger of the two.
         for power_up in self.power_ups:
             power_up.scale(scale_x, scale_y)
-
-    def toggle_fullscreen(self):
+        self.power_up_reach = max(self.base_powerup_size,
+                                  int(self.base_powerup_size * min(scale_x, scale_y)))
+
+        # Fonts, rendered text, sprites, the background and overlays are
+        # sized for the old scale
+        self.text_cache.clear()
+        self.sprites.clear()
+        self.background = None
+        self.game_over_overlay = None
+        self.hud = None
+
+    def toggle_fullscreen(self, size=None):
+        """Switch fullscreen on or off; fullscreen is `size` or the desktop size."""
         self.fullscreen = not self.fullscreen
+        if self.render_size is not None:
+            # Only the window changes; the game keeps its size
+            if self.window is not None:
+                if self.fullscreen:
+                    self.window = pygame.display.set_mode(size or desktop_size(), pygame.FULLSCREEN)
+                else:
+                    self.window = pygame.display.set_mode((BASE_WIDTH, BASE_HEIGHT), pygame.RESIZABLE)
+            self.viewport = None
+            return
+
         if self.fullscreen:
-            self.width = DESKTOP_WIDTH
-            self.height = DESKTOP_HEIGHT
-            self.window = pygame.display.set_mode((self.width, self.height), pygame.FULLSCREEN)
+            self.width, self.height = size or desktop_size()
+            if self.window is not None:
+                self.window = pygame.display.set_mode((self.width, self.height), pygame.FULLSCREEN)
         else:
             self.width = BASE_WIDTH
             self.height = BASE_HEIGHT
-            self.window = pygame.display.set_mode((self.width, self.height), pygame.RESIZABLE)
+            if self.window is not None:
+                self.window = pygame.display.set_mode((self.width, self.height), pygame.RESIZABLE)
 
         # Update positions and sizes
         self.update_scale_factors()
         self.player_x = min(max(self.player_x * (self.width / WIDTH), 0),
                            self.width - self.player_size)
+        self.prev_player_x = self.player_x
         self.player_y = self.height - self.player_size - 10
+        if self.recorder is not None:
+            self.recorder.fullscreen(self)
+
+    def resize_window(self, size):
+        """Apply the window size a burst of resize events ended on."""
+        if self.render_size is None:
+            self.handle_resize(size)
+        else:
+            self.window = pygame.display.set_mode(size, pygame.RESIZABLE)
+            self.viewport = None
 
     def handle_resize(self, size):
         self.width, self.height = size
-        self.window = pygame.display.set_mode((self.width, self.height), pygame.RESIZABLE)
+        if self.window is not None:
+            self.window = pygame.display.set_mode((self.width, self.height), pygame.RESIZABLE)
         self.update_scale_factors()
         self.player_y = self.height - self.player_size - 10
+        if self.recorder is not None:
+            self.recorder.resize(self)
 
+    # Random spawn positions. Coins and obstacles that leave play are
+    # moved back to a fresh spawn position in place rather than replaced.
+    def coin_position(self):
+        return self.rng.randint(0, self.width - self.coin_size), self.rng.randint(-100, 0)
+
+    def obstacle_position(self):
+        return self.rng.randint(0, self.width - self.obstacle_size), self.rng.randint(-200, -50)
+
+    # Entities are created, moved and removed through these so the grids stay in sync
     def create_coin(self):
-        return {
-            'x': random.randint(0, self.width - self.coin_size),
-            'y': random.randint(-100, 0)
-        }
+        coin = self.coins.spawn(*self.coin_position())
+        if self.coin_grid is not None:
+            self.coin_grid.insert(coin)
+        return coin
+
+    def respawn_coin(self, coin):
+        coin.x, coin.y = self.coin_position()
+        if self.coin_grid is not None:
+            self.coin_grid.move(coin)
 
     def create_obstacle(self):
-        return {
-            'x': random.randint(0, self.width - self.obstacle_size),
-            'y': random.randint(-200, -50)
-        }
+        obstacle = self.obstacles.spawn(*self.obstacle_position())
+        if self.obstacle_grid is not None:
+            self.obstacle_grid.insert(obstacle)
+        return obstacle
+
+    def respawn_obstacle(self, obstacle):
+        obstacle.x, obstacle.y = self.obstacle_position()
+        if self.obstacle_grid is not None:
+            self.obstacle_grid.move(obstacle)
+
+    def add_power_up(self, power_up):
+        self.power_ups.add(power_up)
+        if self.power_up_grid is not None:
+            self.power_up_grid.insert(power_up)
+
+    def remove_power_up(self, power_up):
+        self.power_ups.remove(power_up)
+        if self.power_up_grid is not None:
+            self.power_up_grid.remove(power_up)
 
     def create_power_up(self):
         # Get list of available power-ups based on current level
-        available_power_ups = [
-            power_up_type for power_up_type, unlock_level in self.powerup_unlock_levels.items()
-            if self.level >= unlock_level
-        ]
+        available_power_ups = self.spawns.rules(self.level).power_ups
 
         # If no power-ups are available yet, return None
         if not available_power_ups:
             return None
 
-        power_up_type = random.choice(available_power_ups)
+        power_up_type = self.rng.choice(available_power_ups)
         return PowerUp(
-            random.randint(0, self.width - self.base_powerup_size),
-            random.randint(-100, -30),
+            self.rng.randint(0, self.width - self.base_powerup_size),
+            self.rng.randint(-100, -30),
             power_up_type
         )
 
     def reset_game(self):
+        if self.recorder is not None:
+            self.recorder.reset(self)
+        if self.telemetry is not None:
+            self.telemetry.reset(self)
+
         # Reset player position and health
         self.player_x = self.width // 2 - self.player_size // 2
+        self.prev_player_x = self.player_x
         self.player_y = self.height - self.player_size - 10
         self.current_health = self.max_health
         self.invulnerable = False
-        self.invulnerable_timer = 0
+        self.invulnerable_until = 0
+        self.flashing = False
         self.player_color = WHITE
+        self.timers.clear()
+        self.newly_unlocked_powerups = []
 
         # Reset level
         self.level = 1
         self.coins_collected_this_level = 0
+        self.timers.schedule(self.ticks + 1, 'start_spawns', self.level)
         self.coin_speed = self.base_coin_speed * min(scale_x, scale_y)
         self.obstacle_speed = self.base_obstacle_speed * min(scale_x, scale_y)
         self.original_obstacle_speed = self.obstacle_speed  # Reset original speed
 
         # Reset coins and obstacles
-        self.coins = [self.create_coin()]
-        self.obstacles = [self.create_obstacle()]
+        self.coins.clear()
+        self.obstacles.clear()
+        if self.swarm:
+            self.coin_grid.clear()
+            self.obstacle_grid.clear()
+        for _ in range(self.entity_multiplier):
+            self.create_coin()
+        for _ in range(self.entity_multiplier):
+            self.create_obstacle()
 
         # Reset power-ups
-        self.power_ups = []
+        self.power_ups.clear()
+        if self.swarm:
+            self.power_up_grid.clear()
         self.active_power_ups = {
             POWERUP_INVINCIBLE: None,
             POWERUP_DOUBLE_POINTS: None,
             POWERUP_SLOW_OBSTACLES: None
         }
 
+        if self.particles is not None:
+            self.particles.clear()
+
         # Reset score
         self.score = 0
 
@@ -265,14 +547,15 @@ class Game:
         previous_level = self.level
         self.level += 1
         self.coins_collected_this_level = 0
+        rules = self.spawns.rules(self.level)
+        self.timers.schedule(self.ticks + 1, 'start_spawns', self.level)
 
         # Check for newly unlocked power-ups
-        self.newly_unlocked_powerups = [
-            power_up_type for power_up_type, unlock_level in self.powerup_unlock_levels.items()
-            if unlock_level == self.level
-        ]
+        self.newly_unlocked_powerups = list(rules.unlocked)
         if self.newly_unlocked_powerups:
-            self.notification_start = pygame.time.get_ticks()
+            self.notification_start = self.ticks
+            self.timers.schedule(self.ticks + self.ticks_for(self.notification_duration),
+                                 'dismiss_notification', self.ticks)
 
         # Increase speeds based on level
         self.coin_speed = (self.base_coin_speed *
@@ -284,322 +567,867 @@ class Game:
         self.original_obstacle_speed = self.obstacle_speed
 
         # Add more coins and obstacles as levels progress
-        max_coins = min(3, 1 + self.level // 3)
-        max_obstacles = min(3, 1 + self.level // 4)
-
-        while len(self.coins) < max_coins:
-            self.coins.append(self.create_coin())
-        while len(self.obstacles) < max_obstacles:
-            self.obstacles.append(self.create_obstacle())
+        while len(self.coins) < rules.max_coins:
+            self.create_coin()
+        while len(self.obstacles) < rules.max_obstacles:
+            self.create_obstacle()
 
         # Give bonus health every 5 levels
         if self.level % 5 == 0:
             self.current_health = min(self.max_health, self.current_health + 1)
 
-    def handle_events(self):
-        for event in pygame.event.get():
+    def handle_events(self, events=None):
+        """Handle window and key events: `events`, or everything in pygame's queue."""
+        resized = None
+        for event in pygame.event.get() if events is None else events:
             if event.type == pygame.QUIT:
                 return False
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_F11:
                     self.toggle_fullscreen()
+                elif event.key == pygame.K_F9:
+                    self.dirty_rects = not self.dirty_rects
+                    self.full_redraw = True
+                elif event.key == pygame.K_F3:
+                    self.profiler.toggle()
+                    self.full_redraw = True
                 elif event.key == pygame.K_r and self.game_over:
                     self.reset_game()
+                elif event.key == pygame.K_p:
+                    self.paused = not self.paused
+                    self.auto_paused = False
                 elif event.key == pygame.K_ESCAPE:
                     if self.fullscreen:
                         self.toggle_fullscreen()
                     else:
                         return False
             elif event.type == pygame.VIDEORESIZE and not self.fullscreen:
-                self.handle_resize(event.size)
+                resized = event.size
+            elif event.type == pygame.WINDOWMINIMIZED and not self.paused:
+                self.paused = self.auto_paused = True
+            elif event.type == pygame.WINDOWRESTORED and self.auto_paused:
+                self.paused = self.auto_paused = False
+
+        # Dragging a window edge sends resize events frame after frame. The
+        # window is only set up again, once, on the first frame without one.
+        if resized is not None:
+            self.pending_size = resized
+        elif self.pending_size is not None:
+            self.resize_window(self.pending_size)
+            self.pending_size = None
         return True
 
+    # Timer events, run by name from update(). Each carries what it was
+    # scheduled for, so a timer that has been superseded does nothing.
+    def run_timers(self):
+        for kind, args in self.timers.due(self.ticks):
+            getattr(self, kind)(*args)
+
+    def expire_power_up(self, power_up_type, start_time):
+        power_up = self.active_power_ups[power_up_type]
+        if power_up is None or power_up.start_time != start_time:
+            return
+        self.active_power_ups[power_up_type] = None
+        if power_up_type == POWERUP_SLOW_OBSTACLES:
+            self.obstacle_speed = self.original_obstacle_speed
+        elif power_up_type == POWERUP_INVINCIBLE:
+            # Invulnerability can't run out while invincible; it ends with it
+            self.invulnerable = False
+        self.update_player_color()
+
+    def end_invulnerability(self, until):
+        if self.invulnerable and self.invulnerable_until == until and not self.invincible():
+            self.invulnerable = False
+            self.update_player_color()
+
+    def flash(self):
+        self.flash_on = not self.flash_on
+        self.flashing = self.invulnerable or self.invincible()
+        if self.flashing:
+            self.timers.schedule(self.ticks + self.ticks_for(self.flash_interval), 'flash')
+        self.update_player_color()
+
+    # The spawn timeline. Each level starts its own, from the tick it was
+    # reached, and only the next spawn is ever scheduled; the events of an
+    # earlier level, or of a game that is over, do nothing.
+    def start_spawns(self, level):
+        if level != self.level or self.game_over:
+            return
+        rules = self.spawns.rules(level)
+        # Up to the level's counts. advance_level() has added them for a
+        # level reached in play, but level 1's may be authored after the
+        # game was made.
+        while len(self.coins) < rules.max_coins:
+            self.create_coin()
+        while len(self.obstacles) < rules.max_obstacles:
+            self.create_obstacle()
+        origin = self.ticks - 1
+        self.schedule_power_up(rules, origin)
+        for offset, column, power_up_type in rules.drops:
+            self.timers.schedule(origin + offset, 'drop_power_up', level, column, power_up_type)
+
+    def schedule_power_up(self, rules, after):
+        gap = rules.gap(self.rng)
+        if gap is not None:
+            self.timers.schedule(after + gap, 'spawn_power_up', rules.level)
+
+    def spawn_power_up(self, level):
+        if level != self.level or self.game_over:
+            return
+        new_power_up = self.create_power_up()
+        if new_power_up:  # Only add if a valid power-up was created
+            self.add_power_up(new_power_up)
+        self.schedule_power_up(self.spawns.rules(level), self.ticks)
+
+    def drop_power_up(self, level, column, power_up_type):
+        if level != self.level or self.game_over:
+            return
+        if power_up_type is None:
+            available_power_ups = self.spawns.rules(level).power_ups
+            if not available_power_ups:
+                return
+            power_up_type = self.rng.choice(available_power_ups)
+        x = round(column * (self.width - self.base_powerup_size))
+        self.add_power_up(PowerUp(x, -self.base_powerup_size, power_up_type))
+
+    def dismiss_notification(self, start):
+        if self.notification_start == start:
+            self.newly_unlocked_powerups = []
+
+    def start_flashing(self):
+        if not self.flashing:
+            self.flashing = True
+            self.flash_on = False
+            self.timers.schedule(self.ticks + self.ticks_for(self.flash_interval), 'flash')
+        self.update_player_color()
+
+    def invincible(self):
+        return self.active_power_ups[POWERUP_INVINCIBLE] is not None
+
+    def update_player_color(self):
+        if self.invincible():
+            self.player_color = GOLD if self.flash_on else WHITE
+        elif self.invulnerable:
+            self.player_color = BLUE if self.flash_on else WHITE
+        else:
+            self.player_color = WHITE
+
     def update_power_ups(self):
-        # Update existing power-ups
-        for power_up_type, power_up in list(self.active_power_ups.items()):
-            if power_up and power_up.is_expired():
-                if power_up_type == POWERUP_SLOW_OBSTACLES:
-                    self.obstacle_speed = self.original_obstacle_speed
-                self.active_power_ups[power_up_type] = None
-
-        # Spawn new power-ups
-        if random.random() < self.power_up_spawn_chance:
-            new_power_up = self.create_power_up()
-            if new_power_up:  # Only append if a valid power-up was created
-                self.power_ups.append(new_power_up)
-
-        # Update falling power-ups
-        for power_up in self.power_ups[:]:
-            power_up.y += self.power_up_speed
+        # Update falling power-ups; new ones come from the spawn timeline.
+        # Walking backwards, a removal swaps in a power-up that has already
+        # moved this tick.
+        grid = self.power_up_grid
+        speed = self.power_up_speed * self.dt
+        power_ups = self.power_ups.active
+        for i in range(len(power_ups) - 1, -1, -1):
+            power_up = power_ups[i]
+            power_up.y += speed
             if power_up.y > self.height:
-                self.power_ups.remove(power_up)
+                self.remove_power_up(power_up)
+            elif grid is not None:
+                grid.move(power_up)
+
+    def effect(self, x, y, count, color, speed, life, spread=0, rise=0):
+        """A burst of particles, if the game has them; speeds are at base scale."""
+        if self.particles is not None:
+            scale = min(scale_x, scale_y)
+            self.particles.burst(x, y, count, color, speed * scale, life, spread, rise * scale)
+
+    def player_center(self):
+        half = self.player_size / 2
+        return self.player_x + half, self.player_y + half
 
     def apply_power_up(self, power_up):
+        self.effect(*self.player_center(), 60, power_up.color, 220, 0.9,
+                    spread=self.player_size / 2, rise=60)
+        if self.telemetry is not None:
+            self.telemetry.power_up(self, power_up.type)
         if power_up.type == POWERUP_HEALTH:
             self.current_health = min(self.max_health, self.current_health + 1)
         else:
-            power_up.activate()
+            power_up.activate(self.time_ms)
             self.active_power_ups[power_up.type] = power_up
+            self.timers.schedule(self.ticks + self.ticks_for(power_up.duration * 1000),
+                                 'expire_power_up', power_up.type, power_up.start_time)
 
             if power_up.type == POWERUP_SLOW_OBSTACLES:
                 self.obstacle_speed = self.original_obstacle_speed * 0.5
+            elif power_up.type == POWERUP_INVINCIBLE:
+                self.start_flashing()
 
     def update(self):
+        self.ticks += 1
+        self.run_timers()
+        if self.particles is not None:
+            self.particles.step(self.dt)
         if not self.game_over:
-            current_time = pygame.time.get_ticks()
+            profiler = self.profiler
 
             # Update power-ups
             self.update_power_ups()
-
-            # Check if invincible power-up is active
-            invincible_power_up = self.active_power_ups[POWERUP_INVINCIBLE]
-            is_power_up_invincible = invincible_power_up and invincible_power_up.active
-
-            # Update regular invulnerability
-            if self.invulnerable and not is_power_up_invincible:
-                if current_time - self.invulnerable_timer > self.invulnerable_duration:
-                    self.invulnerable = False
-                    self.player_color = WHITE
-                else:
-                    # Flash player while invulnerable
-                    if (current_time // 200) % 2:
-                        self.player_color = WHITE
-                    else:
-                        self.player_color = BLUE
-
-            # Update power-up invincibility color
-            if is_power_up_invincible:
-                if (current_time // 200) % 2:
-                    self.player_color = GOLD
-                else:
-                    self.player_color = WHITE
+            profiler.lap('power_ups')
+            is_power_up_invincible = self.invincible()
 
             # Player movement
-            keys = pygame.key.get_pressed()
-            if keys[pygame.K_LEFT] and self.player_x > 0:
-                self.player_x -= self.player_speed
-            if keys[pygame.K_RIGHT] and self.player_x < self.width - self.player_size:
-                self.player_x += self.player_speed
+            self.prev_player_x = self.player_x
+            keys = self.input_provider.read(self)
+            if keys.left and self.player_x > 0:
+                self.player_x -= self.player_speed * self.dt
+            if keys.right and self.player_x < self.width - self.player_size:
+                self.player_x += self.player_speed * self.dt
+            profiler.lap('movement')
 
-            # Update coins
             player_rect = pygame.Rect(self.player_x, self.player_y,
                                     self.player_size, self.player_size)
-            for coin in self.coins[:]:
-                coin['y'] += self.coin_speed
-                if coin['y'] > self.height:
-                    self.coins.remove(coin)
-                    self.coins.append(self.create_coin())
-                else:
-                    coin_rect = pygame.Rect(coin['x'], coin['y'],
-                                          self.coin_size, self.coin_size)
-                    if player_rect.colliderect(coin_rect):
-                        # Check for double points power-up
-                        points = self.level
-                        if self.active_power_ups[POWERUP_DOUBLE_POINTS]:
-                            points *= 2
-                        self.score += points
-                        self.coins_collected_this_level += 1
-                        self.coins.remove(coin)
-                        self.coins.append(self.create_coin())
-
-                        # Check for level advancement
-                        if self.coins_collected_this_level >= self.coins_for_next_level:
-                            self.advance_level()
-
-            # Update obstacles
-            for obstacle in self.obstacles[:]:
-                obstacle['y'] += self.obstacle_speed
-                if obstacle['y'] > self.height:
-                    self.obstacles.remove(obstacle)
-                    self.obstacles.append(self.create_obstacle())
-                else:
-                    obstacle_rect = pygame.Rect(obstacle['x'], obstacle['y'],
-                                             self.obstacle_size, self.obstacle_size)
-                    if (player_rect.colliderect(obstacle_rect) and
-                        not self.invulnerable and
-                        not is_power_up_invincible):
-                        self.current_health -= 1
-                        if self.current_health <= 0:
-                            self.game_over = True
-                        else:
-                            # Start invulnerability period
-                            self.invulnerable = True
-                            self.invulnerable_timer = current_time
-                            # Reset obstacle position
-                            self.obstacles.remove(obstacle)
-                            self.obstacles.append(self.create_obstacle())
+
+            # Move coins, respawning those that fell off screen
+            speed = self.coin_speed * self.dt
+            grid = self.coin_grid
+            for coin in self.coins.active:
+                coin.y += speed
+                if coin.y > self.height:
+                    self.respawn_coin(coin)
+                elif grid is not None:
+                    grid.move(coin)
+            profiler.lap('coins')
+
+            # Collect coins touching the player
+            for coin in self.colliding(player_rect, self.coins, self.coin_grid, self.coin_size):
+                # Check for double points power-up
+                points = self.level
+                if self.active_power_ups[POWERUP_DOUBLE_POINTS]:
+                    points *= 2
+                self.score += points
+                self.coins_collected_this_level += 1
+                half = self.coin_size / 2
+                self.effect(coin.x + half, coin.y + half, 16, YELLOW, 150, 0.5, rise=80)
+                self.respawn_coin(coin)
+
+                # Check for level advancement
+                if self.coins_collected_this_level >= self.coins_for_next_level:
+                    self.advance_level()
+            profiler.lap('collisions')
+
+            # Move obstacles, respawning those that fell off screen
+            speed = self.obstacle_speed * self.dt
+            grid = self.obstacle_grid
+            for obstacle in self.obstacles.active:
+                obstacle.y += speed
+                if obstacle.y > self.height:
+                    self.respawn_obstacle(obstacle)
+                elif grid is not None:
+                    grid.move(obstacle)
+            profiler.lap('obstacles')
+
+            # Obstacles touching the player cost health
+            for obstacle in self.colliding(player_rect, self.obstacles, self.obstacle_grid,
+                                           self.obstacle_size):
+                if not self.invulnerable and not is_power_up_invincible:
+                    self.current_health -= 1
+                    self.effect(*self.player_center(), 40, RED, 260, 0.6)
+                    if self.telemetry is not None:
+                        self.telemetry.damage(self)
+                    if self.current_health <= 0:
+                        self.game_over = True
+                        if self.telemetry is not None:
+                            self.telemetry.game_over(self)
+                        break  # the rest of the hits land on a finished game
+                    else:
+                        # Start invulnerability period
+                        self.invulnerable = True
+                        self.invulnerable_until = self.ticks + self.ticks_for(self.invulnerable_duration)
+                        self.timers.schedule(self.invulnerable_until, 'end_invulnerability',
+                                             self.invulnerable_until)
+                        self.start_flashing()
+                        # Reset obstacle position
+                        self.respawn_obstacle(obstacle)
 
             # Check power-up collisions
-            for power_up in self.power_ups[:]:
-                power_up_rect = pygame.Rect(power_up.x, power_up.y,
-                                          power_up.size, power_up.size)
-                if player_rect.colliderect(power_up_rect):
-                    self.apply_power_up(power_up)
-                    self.power_ups.remove(power_up)
-
-    def draw_power_up_status(self):
-        font = pygame.font.Font(None, int(24 * min(scale_x, scale_y)))
+            for power_up in self.colliding(player_rect, self.power_ups, self.power_up_grid, None,
+                                           self.power_up_reach):
+                self.apply_power_up(power_up)
+                self.remove_power_up(power_up)
+            profiler.lap('collisions')
+
+            # Invincibility trails gold sparkles
+            if is_power_up_invincible and self.particles is not None:
+                self.effect(*self.player_center(), 2, GOLD, 30, 0.4, spread=self.player_size / 2)
+
+    def colliding(self, player_rect, pool, grid, size, reach=None):
+        """The entities of `pool` touching the player, in pool order.
+
+        `size` is their size, or None for each one's own `size`, up to
+        `reach`. Big pools are narrowed down through their grid, when they
+        have one, and the candidates checked with one collidelistall();
+        small ones are cheaper to scan whole. Hits come back in pool order
+        either way, so several on the same tick resolve the same.
+        """
+        if grid is None or len(pool) < BROADPHASE_MIN:
+            collides = player_rect.colliderect
+            if size is None:
+                return [entity for entity in pool.active
+                        if collides(entity.x, entity.y, entity.size, entity.size)]
+            return [entity for entity in pool.active if collides(entity.x, entity.y, size, size)]
+        candidates = grid.query(player_rect, size if reach is None else reach)
+        if not candidates:
+            return candidates
+        if size is None:
+            rects = [(entity.x, entity.y, entity.size, entity.size) for entity in candidates]
+        else:
+            rects = [(entity.x, entity.y, size, size) for entity in candidates]
+        hits = [candidates[i] for i in player_rect.collidelistall(rects)]
+        if len(hits) > 1:
+            hits.sort(key=attrgetter('index'))
+        return hits
+
+    def step(self, n=1):
+        """Run up to n ticks back to back, without a frame cap.
+
+        Stops early at game over and returns the number of ticks run.
+        """
+        for i in range(n):
+            if self.game_over:
+                return i
+            self.update()
+        return n
+
+    def snapshot(self):
+        """The simulation's state, as a tuple of immutable values, for restore().
+
+        Taking and restoring one costs microseconds, so a search bot or a
+        balance tester can branch many futures from the same moment. Timers
+        are on the tick clock, so restored power-ups have the time left that
+        they had. The size and the settings (level_multiplier and so on)
+        aren't saved: restore into the game the snapshot came from, or one
+        made the same way.
+        """
+        falling = tuple((power_up.x, power_up.y, power_up.type, power_up.size)
+                        for power_up in self.power_ups)
+        active = tuple((power_up.type, power_up.start_time, power_up.duration)
+                       for power_up in self.active_power_ups.values() if power_up is not None)
+        return (snapshot_attributes(self), self.rng.getstate(),
+                tuple(self.timers.queue), self.timers.sequence,
+                tuple(map(position, self.coins.active)),
+                tuple(map(position, self.obstacles.active)),
+                falling, active, tuple(self.newly_unlocked_powerups))
+
+    def restore(self, snapshot):
+        """Put the simulation back to where snapshot() was taken."""
+        (values, rng_state, timers, sequence, coins, obstacles,
+         falling, active, notifications) = snapshot
+        for name, value in zip(SNAPSHOT_ATTRIBUTES, values):
+            setattr(self, name, value)
+        self.rng.setstate(rng_state)
+        self.timers.queue[:] = timers
+        self.timers.sequence = sequence
+        self.restore_positions(self.coins, self.coin_grid, coins)
+        self.restore_positions(self.obstacles, self.obstacle_grid, obstacles)
+
+        self.power_ups.clear()
+        if self.power_up_grid is not None:
+            self.power_up_grid.clear()
+        for x, y, power_up_type, size in falling:
+            power_up = PowerUp(x, y, power_up_type)
+            power_up.size = size
+            self.add_power_up(power_up)
+        self.active_power_ups = dict.fromkeys(self.active_power_ups)
+        for power_up_type, start_time, duration in active:
+            power_up = PowerUp(0, 0, power_up_type)
+            power_up.duration = duration
+            power_up.activate(start_time)
+            self.active_power_ups[power_up_type] = power_up
+
+        self.newly_unlocked_powerups = list(notifications)
+        self.full_redraw = True
+
+    def restore_positions(self, pool, grid, positions):
+        """Move a pool's entities to `positions`, spawning or releasing the difference."""
+        entities = pool.active
+        while len(entities) > len(positions):
+            entity = entities[-1]
+            if grid is not None:
+                grid.remove(entity)
+            pool.release(entity)
+        for entity, (x, y) in zip(entities, positions):
+            entity.x = x
+            entity.y = y
+            if grid is not None:
+                grid.move(entity)
+        for x, y in positions[len(entities):]:
+            entity = pool.spawn(x, y)
+            if grid is not None:
+                grid.insert(entity)
+
+    def hud_power_up_status(self, blits):
+        font_size = int(24 * min(scale_x, scale_y))
         y_offset = int(80 * scale_y)
 
         for power_up_type, power_up in self.active_power_ups.items():
             if power_up and power_up.active:
-                time_left = power_up.time_remaining()
+                time_left = power_up.time_remaining(self.time_ms)
                 if time_left > 0:
                     text = f"{power_up_type.title()}: {time_left:.1f}s"
-                    text_surface = font.render(text, True, power_up.color)
-                    window.blit(text_surface, (10, y_offset))
+                    text_surface = self.text_cache.render(text, font_size, power_up.color)
+                    blits.append((text_surface, (10, y_offset)))
                     y_offset += int(25 * scale_y)
 
-    def draw_diamond(self, surface, color, x, y, size):
-        points = [
-            (x + size//2, y),  # top
-            (x + size, y + size//2),  # right
-            (x + size//2, y + size),  # bottom
-            (x, y + size//2)  # left
-        ]
-        pygame.draw.polygon(surface, color, points)
-
-    def draw_health_bar(self):
-        # Health bar background
+    def health_bar_rect(self):
+        return pygame.Rect(int(10 * scale_x), int(40 * scale_y), int(200 * scale_x), int(20 * scale_y))
+
+    def level_progress_rect(self):
         bar_width = int(200 * scale_x)
-        bar_height = int(20 * scale_y)
-        bar_x = int(10 * scale_x)
-        bar_y = int(40 * scale_y)
-        pygame.draw.rect(window, RED, (bar_x, bar_y, bar_width, bar_height))
+        return pygame.Rect(self.width - bar_width - int(10 * scale_x), int(40 * scale_y),
+                           bar_width, int(20 * scale_y))
+
+    def build_background(self):
+        background = pygame.Surface((self.width, self.height))
+        background.fill(BLACK)
+
+        # Bar backgrounds
+        pygame.draw.rect(background, RED, self.health_bar_rect())
+        pygame.draw.rect(background, BLUE, self.level_progress_rect())
+
+        # Level label
+        level_text = self.text_cache.render(f'Level: {self.level}', int(36 * min(scale_x, scale_y)), WHITE)
+        background.blit(level_text, (self.width - int(150 * scale_x), int(10 * scale_y)))
+
+        self.background = background.convert()
+        self.background_level = self.level
+        self.full_redraw = True
+
+    def build_overlays(self):
+        """The game over overlay and a notification background tall enough
+        for every power-up; notifications blit `notification_area` of it."""
+        overlay = pygame.Surface((self.width, self.height)).convert()
+        overlay.fill(BLACK)
+        overlay.set_alpha(128)
+        self.game_over_overlay = overlay
+
+        max_notifications = len(self.powerup_unlock_levels)
+        notification_bg = pygame.Surface((self.width // 2, max_notifications * 40 + 20)).convert()
+        notification_bg.fill(BLACK)
+        notification_bg.set_alpha(200)
+        self.notification_bg = notification_bg
+        self.notification_area = notification_bg.get_rect()
+
+    def hud_health_bar(self, fills, blits):
+        bar = self.health_bar_rect()
 
         # Health bar fill
         health_percentage = self.current_health / self.max_health
-        health_width = bar_width * health_percentage
-        pygame.draw.rect(window, GREEN, (bar_x, bar_y, health_width, bar_height))
+        health_width = int(bar.width * health_percentage)
+        fills.append((GREEN, (bar.x, bar.y, health_width, bar.height)))
 
         # Health text
-        font = pygame.font.Font(None, int(24 * min(scale_x, scale_y)))
-        health_text = font.render(f'Health: {int(health_percentage * 100)}%', True, WHITE)
-        window.blit(health_text, (bar_x + bar_width + 10, bar_y + 2))
+        health_text = self.text_cache.render(f'Health: {int(health_percentage * 100)}%',
+                                             int(24 * min(scale_x, scale_y)), WHITE)
+        blits.append((health_text, (bar.right + 10, bar.y + 2)))
 
-    def draw_level_progress(self):
-        # Level progress bar
-        bar_width = int(200 * scale_x)
-        bar_height = int(20 * scale_y)
-        bar_x = self.width - bar_width - int(10 * scale_x)
-        bar_y = int(40 * scale_y)
-        pygame.draw.rect(window, BLUE, (bar_x, bar_y, bar_width, bar_height))
+    def hud_level_progress(self, fills, blits):
+        bar = self.level_progress_rect()
 
         # Progress fill
         progress = self.coins_collected_this_level / self.coins_for_next_level
-        progress_width = bar_width * progress
-        pygame.draw.rect(window, PURPLE, (bar_x, bar_y, progress_width, bar_height))
+        progress_width = int(bar.width * progress)
+        fills.append((PURPLE, (bar.x, bar.y, progress_width, bar.height)))
 
         # Progress text
-        font = pygame.font.Font(None, int(24 * min(scale_x, scale_y)))
-        progress_text = font.render(f'Level Progress: {int(progress * 100)}%', True, WHITE)
-        text_rect = progress_text.get_rect(right=bar_x - 10, centery=bar_y + bar_height//2)
-        window.blit(progress_text, text_rect)
-
-    def draw(self):
-        window.fill(BLACK)
-
-        # Draw player
-        pygame.draw.rect(window, self.player_color,
-                        (self.player_x, self.player_y, self.player_size, self.player_size))
-
-        # Draw coins
+        progress_text = self.text_cache.render(f'Level Progress: {int(progress * 100)}%',
+                                               int(24 * min(scale_x, scale_y)), WHITE)
+        blits.append((progress_text, progress_text.get_rect(right=bar.x - 10, centery=bar.centery)))
+
+    def hud_timers(self):
+        """The power-up timers as the HUD shows them, to a tenth of a second,
+        packed into one number that changes exactly when their text does."""
+        shown = 0
+        for power_up in self.active_power_ups.values():
+            shown <<= 20
+            if power_up and power_up.active:
+                time_left = power_up.time_remaining(self.time_ms)
+                if time_left > 0:
+                    shown += int(round(time_left, 1) * 10 + 0.5) + 1
+        return shown
+
+    def hud_changed(self):
+        """Whether anything the HUD shows has changed since it was laid out.
+        Compared one by one: a tuple of them every frame would allocate."""
+        shown = self.hud_shown
+        return (self.score != shown[0] or self.current_health != shown[1] or
+                self.coins_collected_this_level != shown[2] or
+                self.coins_for_next_level != shown[3] or self.hud_timers() != shown[4])
+
+    def draw_hud(self, rects):
+        """Score, health bar, level progress and power-up timers."""
+        if self.hud is None or (self.hud_changed() and (
+                self.quality < SLOW_HUD or self.frames_drawn % self.hud_interval == 0)):
+            self.hud = None  # dropped before the new one is built, not after
+            fills = []
+            blits = []
+            # The level label is part of the background
+            score_text = self.text_cache.render(f'Score: {self.score}',
+                                                int(36 * min(scale_x, scale_y)), WHITE)
+            blits.append((score_text, (int(10 * scale_x), int(10 * scale_y))))
+            self.hud_health_bar(fills, blits)
+            self.hud_level_progress(fills, blits)
+            self.hud_power_up_status(blits)
+            self.hud = fills, blits, None
+            self.hud_shown[:] = (self.score, self.current_health, self.coins_collected_this_level,
+                                 self.coins_for_next_level, self.hud_timers())
+
+        # A layout covers the same areas every time it's drawn. Dirty-rect
+        # mode needs them, so they're kept from the first time.
+        fills, blits, areas = self.hud
+        if areas is not None or not self.dirty_rects:
+            for color, rect in fills:
+                if rect[2] > 0:
+                    self.screen.fill(color, rect)
+            self.screen.blits(blits, False)
+        else:
+            areas = [self.screen.fill(color, rect) for color, rect in fills if rect[2] > 0]
+            areas.extend(self.screen.blits(blits))
+            self.hud = fills, blits, areas
+        if self.dirty_rects:
+            rects.extend(areas)
+
+    def draw(self, alpha=1.0):
+        """Draw the game `alpha` of the way from the previous tick to the current one.
+
+        Falling objects move at a constant speed, so their previous position is
+        their speed times one tick behind; the player keeps prev_player_x.
+
+        In dirty-rect mode only the areas drawn last frame are restored from
+        the background, and only those plus this frame's areas are presented.
+        Frames with a translucent overlay, and the frame after one, are
+        always drawn and presented in full.
+        """
+        if self.game_over:
+            alpha = 1.0
+        lag = (1 - alpha) * self.dt
+        profiler = self.profiler
+        if self.render_size is None:
+            self.screen = self.window
+        elif self.screen is None:
+            self.screen = pygame.Surface(self.render_size).convert()
+            self.full_redraw = True
+
+        if self.background is None or self.background_level != self.level:
+            self.build_background()
+        if self.game_over_overlay is None:
+            self.build_overlays()
+
+        showing_notification = bool(self.newly_unlocked_powerups)
+        full_redraw = (not self.dirty_rects or self.full_redraw or
+                       showing_notification or self.game_over)
+        rects = self.rects
+        if full_redraw:
+            self.screen.blit(self.background, (0, 0))
+        else:
+            for rect in self.previous_rects:
+                self.screen.blit(self.background, rect, rect)
+
+        # Draw every entity from the sprite atlas in a single blits() call,
+        # filling in the reused [sprite, area] pairs of entity_blits. Each
+        # area covers its sprite, for presenting and erasing in dirty-rect
+        # mode; Rects truncate like int().
+        sprites = self.sprites
+        blits = self.entity_blits
+        areas = self.entity_areas[self.frames_drawn % 2]
+        spare = self.spare_areas
+        count = 1 + len(self.coins) + len(self.obstacles) + len(self.power_ups)
+        while len(blits) < count:
+            blits.append([None, None])
+        del blits[count:]
+        while len(areas) < count:
+            areas.append(spare.pop() if spare else pygame.Rect(0, 0, 0, 0))
+        while len(areas) > count:
+            spare.append(areas.pop())
+
+        # Player
+        player_x = self.prev_player_x + (self.player_x - self.prev_player_x) * alpha
+        item = blits[0]
+        item[0] = sprites.get('rect', self.player_color, self.player_size)
+        item[1] = area = areas[0]
+        area.update(player_x, self.player_y, self.player_size, self.player_size)
+        i = 1
+
+        # Coins and power-ups are plain squares at SIMPLE_SHAPES: opaque
+        # sprites blit faster than ones with per-pixel alpha
+        simple = self.quality >= SIMPLE_SHAPES
+
+        # Coins
+        coin_sprite = sprites.get('rect' if simple else 'circle', YELLOW, self.coin_size)
+        coin_extent = coin_sprite.get_width()
+        coin_lag = self.coin_speed * lag
         for coin in self.coins:
-            pygame.draw.circle(window, YELLOW,
-                             (int(coin['x'] + self.coin_size//2),
-                              int(coin['y'] + self.coin_size//2)),
-                             self.coin_size//2)
-
-        # Draw obstacles
+            item = blits[i]
+            item[0] = coin_sprite
+            item[1] = area = areas[i]
+            area.update(coin.x, coin.y - coin_lag, coin_extent, coin_extent)
+            i += 1
+
+        # Obstacles
+        obstacle_sprite = sprites.get('rect', RED, self.obstacle_size)
+        obstacle_size = self.obstacle_size
+        obstacle_lag = self.obstacle_speed * lag
         for obstacle in self.obstacles:
-            pygame.draw.rect(window, RED,
-                           (obstacle['x'], obstacle['y'],
-                            self.obstacle_size, self.obstacle_size))
-
-        # Draw power-ups
+            item = blits[i]
+            item[0] = obstacle_sprite
+            item[1] = area = areas[i]
+            area.update(obstacle.x, obstacle.y - obstacle_lag, obstacle_size, obstacle_size)
+            i += 1
+
+        # Power-ups
+        power_up_lag = self.power_up_speed * lag
+        power_up_shape = 'rect' if simple else 'diamond'
         for power_up in self.power_ups:
-            self.draw_diamond(window, power_up.color,
-                            int(power_up.x), int(power_up.y), power_up.size)
-
-        # Draw score and level
-        font = pygame.font.Font(None, int(36 * min(scale_x, scale_y)))
-        score_text = font.render(f'Score: {self.score}', True, WHITE)
-        level_text = font.render(f'Level: {self.level}', True, WHITE)
-        window.blit(score_text, (int(10 * scale_x), int(10 * scale_y)))
-        window.blit(level_text, (self.width - int(150 * scale_x), int(10 * scale_y)))
+            item = blits[i]
+            item[0] = sprite = sprites.get(power_up_shape, power_up.color, power_up.size)
+            item[1] = area = areas[i]
+            extent = sprite.get_width()
+            area.update(power_up.x, power_up.y - power_up_lag, extent, extent)
+            i += 1
+
+        self.screen.blits(blits, False)
+        # Only dirty-rect mode needs to know where things went. Areas off the
+        # edge are clipped when erased and presented. Assigning over the
+        # contents keeps the list's memory, where clear() frees it.
+        if self.dirty_rects:
+            rects[:] = areas
+        else:
+            rects.clear()
+        profiler.lap('entities')
 
-        # Draw health bar and level progress
-        self.draw_health_bar()
-        self.draw_level_progress()
+        # Particles go along with the detailed shapes at SIMPLE_SHAPES
+        if self.particles is not None and self.quality < SIMPLE_SHAPES:
+            area = self.particles.draw(self.screen)
+            if area is not None and self.dirty_rects:
+                rects.append(area)
+        profiler.lap('particles')
 
-        # Draw active power-up status
-        self.draw_power_up_status()
+        self.draw_hud(rects)
+        profiler.lap('hud')
 
         # Draw power-up unlock notifications
-        current_time = pygame.time.get_ticks()
-        if self.newly_unlocked_powerups and current_time - self.notification_start < self.notification_duration:
-            notification_font = pygame.font.Font(None, int(32 * min(scale_x, scale_y)))
+        if showing_notification:
+            notification_font_size = int(32 * min(scale_x, scale_y))
             y_offset = self.height // 4
 
             # Draw notification background
-            notification_bg = pygame.Surface((self.width // 2, len(self.newly_unlocked_powerups) * 40 + 20))
-            notification_bg.fill(BLACK)
-            notification_bg.set_alpha(200)
-            notification_x = self.width // 4
-            notification_y = y_offset - 10
-            window.blit(notification_bg, (notification_x, notification_y))
+            if self.quality < NO_OVERLAYS:
+                self.notification_area.height = len(self.newly_unlocked_powerups) * 40 + 20
+                notification_x = self.width // 4
+                notification_y = y_offset - 10
+                self.screen.blit(self.notification_bg, (notification_x, notification_y),
+                                 self.notification_area)
 
             # Draw unlock messages
             for power_up in self.newly_unlocked_powerups:
                 text = f"New Power-up Unlocked: {power_up.title()}!"
-                text_surface = notification_font.render(text, True, GOLD)
+                text_surface = self.text_cache.render(text, notification_font_size, GOLD)
                 text_rect = text_surface.get_rect(center=(self.width // 2, y_offset))
-                window.blit(text_surface, text_rect)
+                self.screen.blit(text_surface, text_rect)
                 y_offset += 40
-        elif self.newly_unlocked_powerups:
-            # Clear notifications after duration
-            self.newly_unlocked_powerups = []
+        profiler.lap('notifications')
+
+        if self.paused:
+            paused_text = self.text_cache.render('Paused - press P to resume',
+                                                 int(48 * min(scale_x, scale_y)), WHITE)
+            rects.append(self.screen.blit(paused_text, paused_text.get_rect(
+                center=(self.width // 2, self.height // 2))))
 
         # Draw game over screen
         if self.game_over:
-            # Create semi-transparent overlay
-            overlay = pygame.Surface((self.width, self.height))
-            overlay.fill(BLACK)
-            overlay.set_alpha(128)
-            window.blit(overlay, (0, 0))
+            # Semi-transparent overlay
+            if self.quality < NO_OVERLAYS:
+                self.screen.blit(self.game_over_overlay, (0, 0))
 
             # Game Over text
-            game_over_font = pygame.font.Font(None, int(74 * min(scale_x, scale_y)))
-            game_over_text = game_over_font.render('Game Over!', True, RED)
+            game_over_text = self.text_cache.render('Game Over!', int(74 * min(scale_x, scale_y)), RED)
             game_over_rect = game_over_text.get_rect(center=(self.width//2, self.height//2 - int(50 * scale_y)))
-            window.blit(game_over_text, game_over_rect)
+            self.screen.blit(game_over_text, game_over_rect)
 
             # Final score and level
-            final_score_font = pygame.font.Font(None, int(48 * min(scale_x, scale_y)))
-            final_score_text = final_score_font.render(f'Final Score: {self.score} - Level: {self.level}', True, WHITE)
+            final_score_text = self.text_cache.render(f'Final Score: {self.score} - Level: {self.level}',
+                                                      int(48 * min(scale_x, scale_y)), WHITE)
             final_score_rect = final_score_text.get_rect(center=(self.width//2, self.height//2 + int(20 * scale_y)))
-            window.blit(final_score_text, final_score_rect)
+            self.screen.blit(final_score_text, final_score_rect)
 
             # Restart instruction
-            restart_font = pygame.font.Font(None, int(36 * min(scale_x, scale_y)))
-            restart_text = restart_font.render('Press R to Restart or ESC to Quit', True, GREEN)
+            restart_text = self.text_cache.render('Press R to Restart or ESC to Quit',
+                                                  int(36 * min(scale_x, scale_y)), GREEN)
             restart_rect = restart_text.get_rect(center=(self.width//2, self.height//2 + int(80 * scale_y)))
-            window.blit(restart_text, restart_rect)
+            self.screen.blit(restart_text, restart_rect)
+
+            if self.telemetry is not None:
+                self.draw_high_scores(self.height // 2 + int(130 * scale_y))
+        profiler.lap('game_over')
 
+        if profiler.visible:
+            profiler.draw(self.screen, self.text_cache, rects)
+            profiler.lap('overlay')
+
+        if self.render_size is not None:
+            self.present_scaled()
+        elif full_redraw:
+            pygame.display.flip()
+        else:
+            presented = self.presented_rects
+            presented[:] = self.previous_rects
+            presented += rects
+            pygame.display.update(presented)
+        self.rects = self.previous_rects
+        self.previous_rects = rects
+        self.full_redraw = showing_notification or self.game_over
+        self.frames_drawn += 1
+        profiler.lap('present')
+
+    def draw_high_scores(self, top):
+        """The best runs so far, this one highlighted if it made the table."""
+        font_size = int(28 * min(scale_x, scale_y))
+        line_height = int(26 * scale_y)
+        last_run = self.telemetry.last_run
+        for place, run in enumerate(self.telemetry.log.top(HIGH_SCORES_SHOWN), 1):
+            color = YELLOW if run is last_run else WHITE
+            text = self.text_cache.render(f"{place}. {run['score']}  (level {run['level']})",
+                                          font_size, color)
+            self.screen.blit(text, text.get_rect(center=(self.width // 2, top)))
+            top += line_height
+
+    def present_scaled(self):
+        """Scale the whole canvas into the viewport and show it."""
+        if self.viewport is None:
+            window_width, window_height = self.window.get_size()
+            scale = min(window_width / self.width, window_height / self.height)
+            area = pygame.Rect(0, 0, int(self.width * scale), int(self.height * scale))
+            area.center = window_width // 2, window_height // 2
+            self.window.fill(BLACK)
+            self.viewport = self.window.subsurface(area)
+        scale = pygame.transform.smoothscale if self.smooth_scale else pygame.transform.scale
+        scale(self.screen, self.viewport.get_size(), self.viewport)
         pygame.display.flip()
 
+def report_cold_start(imported, display_ready):
+    now = time.perf_counter()
+    print(f"Cold start: first frame after {(now - STARTED) * 1000:.0f} ms "
+          f"(imports {(imported - STARTED) * 1000:.0f} ms, "
+          f"display {(display_ready - imported) * 1000:.0f} ms, "
+          f"game and first frame {(now - display_ready) * 1000:.0f} ms)")
+
+def report_input_latency(keyboard):
+    summary = keyboard.latency_summary()
+    if summary['changes']:
+        print(f"Input latency over the last {summary['changes']} key presses and releases: "
+              f"p50 {summary['p50_ms']:.1f} ms, p95 {summary['p95_ms']:.1f} ms, "
+              f"max {summary['max_ms']:.1f} ms")
+
+def load_particles():
+    """A particles.ParticleSystem, or None if NumPy can't be imported."""
+    try:
+        from particles import ParticleSystem
+    except ImportError:
+        return None
+    return ParticleSystem()
+
+def wait_for_frame(keyboard, clock, next_tick, just_in_time=JUST_IN_TIME_INPUT):
+    """Wait for the next frame, taking in the keyboard's events.
+
+    Just in time, the wait lasts until the next tick is due, at perf_counter()
+    time `next_tick`, polling the keyboard all along: the tick starts with
+    the freshest input and its frame shows it straight away. Otherwise
+    clock.tick() caps frames at FPS and the keyboard is polled once.
+    """
+    if just_in_time:
+        keyboard.wait(next_tick)
+    else:
+        clock.tick(FPS)
+        keyboard.poll()
+
+class FrameLoop:
+    """The game loop, a frame per run_frame(), for main() and benchmarks/latency.py.
+
+    Fixed-timestep simulation: each frame runs as many ticks as the elapsed
+    time covers, then draws once. A slow frame costs rendering, not game speed.
+    """
+    def __init__(self, game, keyboard, clock, governor=None, telemetry=None,
+                 just_in_time=JUST_IN_TIME_INPUT):
+        self.game = game
+        self.keyboard = keyboard
+        self.clock = clock
+        self.governor = governor
+        self.telemetry = telemetry
+        self.just_in_time = just_in_time
+        # ms of game time not yet simulated; a tick's worth to start, so the
+        # first frame runs a tick and draws straight away rather than waiting
+        self.accumulator = game.tick_ms
+        self.last_frame = time.perf_counter()
+
+    def run_frame(self):
+        """Wait for, simulate and draw one frame; False once the game is quit."""
+        game, keyboard, governor = self.game, self.keyboard, self.governor
+        profiler = game.profiler
+        next_tick = self.last_frame + (game.tick_ms - self.accumulator) / 1000
+        wait_for_frame(keyboard, self.clock, next_tick, self.just_in_time)
+        frame_start = time.perf_counter()
+        self.accumulator += min((frame_start - self.last_frame) * 1000, MAX_FRAME_MS)
+        self.last_frame = frame_start
+        profiler.begin_frame()
+        running = game.handle_events(keyboard.take_events())
+        profiler.lap('events')
+        if game.paused:
+            self.accumulator = 0.0  # the game clock stands still
+        # Each tick reads the input of its own slice of the time covered
+        keyboard.start_ticks(frame_start - self.accumulator / 1000)
+        while self.accumulator >= game.tick_ms:
+            game.update()
+            self.accumulator -= game.tick_ms
+        # Over budget, the governor first drops drawing quality and then
+        # whole frames; the updates above run either way
+        if governor is None or governor.should_draw():
+            game.draw(self.accumulator / game.tick_ms)
+            keyboard.presented()
+            frame_ms = (time.perf_counter() - frame_start) * 1000
+            if governor is not None and governor.record(frame_ms):
+                game.quality = governor.level
+                game.full_redraw = True
+            if self.telemetry is not None:
+                self.telemetry.frame(frame_ms)
+        profiler.end_frame()
+        return running
+
 async def main():
+    imported = time.perf_counter()
+    window = init_display()
+    display_ready = time.perf_counter()
+
     clock = pygame.time.Clock()
-    game = Game()
+    profiler = FrameProfiler(budget_ms=1000 / FPS)
+    keyboard = BufferedKeyboardInput()
+    game = Game(window, keyboard, profiler=profiler)
+    recorder = Recorder(game) if RECORD_REPLAY else None
+    telemetry = Telemetry(game, RunLog.open(RUN_LOG)) if RUN_LOG else None
+    governor = QualityGovernor(budget_ms=1000 / FPS) if QUALITY_GOVERNOR else None
+    frames = FrameLoop(game, keyboard, clock, governor, telemetry)
     running = True
+    first_frame = True
 
     while running:
-        running = game.handle_events()
-        game.update()
-        game.draw()
-        clock.tick(60)
+        running = frames.run_frame()
+        if first_frame:
+            report_cold_start(imported, display_ready)
+            first_frame = False
+            # Importing NumPy takes a while, in the browser most of all, so
+            # effects only start once the first frame is on screen
+            if PARTICLES:
+                game.particles = load_particles()
         await asyncio.sleep(0)  # Required for web version
 
+    if PROFILE_EXPORT:
+        profiler.export(PROFILE_EXPORT)
+    if recorder is not None:
+        recorder.save(RECORD_REPLAY)
+    if telemetry is not None:
+        await telemetry.close(game)
+    report_input_latency(keyboard)
     pygame.quit()
 
 if __name__ == "__main__":
@@ -0,0 +1,223 @@
+"""Particle effects for pickups, hits and power-ups, kept in NumPy arrays.
+
+Every particle's position, velocity, life and color index sits in arrays
+allocated once and used as a ring: emitting overwrites the oldest slots, so
+`capacity` is a hard budget. step() moves all of them with a few in-place
+array operations per tick and draw() writes the live ones into the
+surface's pixels, as small dots that darken with age. NumPy has no 24-bit
+integer, so on 24-bit surfaces the dots are blitted instead.
+Nothing per particle is a Python object, so thousands cost well under a
+millisecond a frame.
+
+Effects are cosmetic. They draw from their own random generator, so a game
+plays out the same with or without them, and headless games have none.
+"""
+import math
+
+import numpy as np
+import pygame
+
+FADE_LEVELS = 8  # shades from a color's full brightness down to dark
+DOT_SIZE = 2  # particles are DOT_SIZE x DOT_SIZE pixels
+PIXEL_BYTES = (1, 2, 4)  # pixel sizes that draw() writes straight into
+
+
+class ParticleSystem:
+    """A fixed budget of particles, emitted in bursts and drawn as dots.
+
+    Positions and speeds are in game pixels and pixels per second; gravity
+    pulls particles down at `gravity` px/s^2.
+    """
+    def __init__(self, capacity=4096, gravity=400.0, seed=None):
+        self.capacity = capacity
+        self.gravity = gravity
+        self.rng = np.random.default_rng(seed)
+        self.x = np.zeros(capacity, np.float32)
+        self.y = np.zeros(capacity, np.float32)
+        self.vx = np.zeros(capacity, np.float32)
+        self.vy = np.zeros(capacity, np.float32)
+        self.life = np.zeros(capacity, np.float32)  # seconds left; dead at 0 or below
+        self.lifetime = np.ones(capacity, np.float32)  # seconds it started with
+        self.color = np.zeros(capacity, np.intp)  # row of the palette
+        self.next = 0  # ring slot the next particle goes in
+        self.remaining = 0.0  # until the longest-lived particle dies; idle at 0
+
+        # Colors in emission order, and their FADE_LEVELS shades mapped to
+        # the pixel format of the surface last drawn to: an array of pixel
+        # values, or a list of dot surfaces for other pixel sizes
+        self.colors = []
+        self.color_rows = {}
+        self.palette = None
+        self.palette_surface = None
+
+        # Scratch arrays, so stepping and drawing allocate no particle-sized
+        # memory. `live` and `color_index` hold the drawn particles packed at
+        # the front, with one slot past the end where the rest are dumped.
+        self.mask = np.empty(capacity, bool)
+        self.inside = np.empty(capacity, bool)
+        self.values = np.empty(capacity, np.float32)
+        self.positions = np.empty(capacity, np.intp)
+        self.live = np.empty(capacity + 1, np.float32)
+        self.columns = np.empty(capacity, np.intp)
+        self.rows = np.empty(capacity, np.intp)
+        self.index = np.empty(capacity, np.intp)
+        self.shade_index = np.empty(capacity, np.intp)
+        self.color_index = np.empty(capacity + 1, np.intp)
+        self.shades = None  # in the pixel format's integer type, made with the palette
+        # Bounding boxes of what draw() drew, used in turn, so the one it
+        # returned last is still intact for erasing after the next draw()
+        self.areas = (pygame.Rect(0, 0, 0, 0), pygame.Rect(0, 0, 0, 0))
+        self.areas_used = 0
+
+    def __len__(self):
+        """Live particles."""
+        return int(np.count_nonzero(self.life > 0))
+
+    def clear(self):
+        self.life[:] = 0
+        self.remaining = 0.0
+
+    def burst(self, x, y, count, color, speed, life, spread=0.0, rise=0.0):
+        """Emit `count` particles around (x, y), up to `spread` px away, flying
+        in every direction at up to `speed` px/s plus `rise` px/s upward, each
+        living `life` seconds give or take 30%."""
+        count = min(count, self.capacity)
+        row = self.color_rows.get(color)
+        if row is None:
+            row = self.color_rows[color] = len(self.colors)
+            self.colors.append(color)
+            self.palette = None
+        first = min(count, self.capacity - self.next)
+        self._emit(self.next, first, x, y, row, speed, life, spread, rise)
+        if count > first:
+            self._emit(0, count - first, x, y, row, speed, life, spread, rise)
+        self.next = (self.next + count) % self.capacity
+        self.remaining = max(self.remaining, life * 1.3)
+
+    def _emit(self, start, count, x, y, row, speed, life, spread, rise):
+        end = start + count
+        rng = self.rng
+        angle = rng.uniform(0, 2 * math.pi, count)
+        magnitude = speed * np.sqrt(rng.random(count))  # even over the disc
+        self.vx[start:end] = np.cos(angle) * magnitude
+        self.vy[start:end] = np.sin(angle) * magnitude - rise
+        self.x[start:end] = x + rng.uniform(-spread, spread, count)
+        self.y[start:end] = y + rng.uniform(-spread, spread, count)
+        lifetimes = life * rng.uniform(0.7, 1.3, count)
+        self.life[start:end] = lifetimes
+        self.lifetime[start:end] = lifetimes
+        self.color[start:end] = row
+
+    def step(self, dt):
+        """Move every particle on by `dt` seconds."""
+        if self.remaining <= 0:
+            return
+        self.remaining -= dt
+        values = self.values
+        np.multiply(self.vx, dt, out=values)
+        self.x += values
+        np.multiply(self.vy, dt, out=values)
+        self.y += values
+        self.vy += self.gravity * dt
+        self.life -= dt
+
+    def _build_palette(self, surface):
+        shades = [surface.map_rgb([channel * (level + 1) // FADE_LEVELS for channel in color])
+                  for color in self.colors for level in range(FADE_LEVELS)]
+        if surface.get_bytesize() in PIXEL_BYTES:
+            # Pixels of the surface's own type, so writing them casts nothing
+            dtype = np.dtype(f'uint{8 * surface.get_bytesize()}')
+            self.palette = np.array(shades, dtype)
+            if self.shades is None or self.shades.dtype != dtype:
+                self.shades = np.empty(self.capacity, dtype)
+        else:
+            self.palette = []
+            for shade in shades:
+                dot = pygame.Surface((DOT_SIZE, DOT_SIZE), 0, surface)
+                dot.fill(shade)
+                self.palette.append(dot)
+        self.palette_surface = surface
+
+    def draw(self, surface):
+        """Draw the live particles that are on `surface`, and return their
+        bounding box, or None if none were drawn. The two Rects it returns
+        take turns: each is reused by the call after the one that follows."""
+        if self.remaining <= 0:
+            return None
+        width, height = surface.get_size()
+        mask, inside, values = self.mask, self.inside, self.values
+        np.greater(self.life, 0, out=mask)
+        np.greater_equal(self.x, 0, out=inside)
+        mask &= inside
+        np.less(self.x, width - DOT_SIZE, out=inside)
+        mask &= inside
+        np.greater_equal(self.y, 0, out=inside)
+        mask &= inside
+        np.less(self.y, height - DOT_SIZE, out=inside)
+        mask &= inside
+        # Where each drawn particle goes once packed, and the dump slot for
+        # the others. np.compress would do, but allocates on every call.
+        positions = self.positions
+        np.copyto(positions, mask)
+        np.add.accumulate(positions, out=positions)
+        count = int(positions[-1])
+        if not count:
+            return None
+        positions -= 1
+        np.logical_not(mask, out=inside)
+        np.copyto(positions, self.capacity, where=inside)
+
+        if self.palette is None or self.palette_surface is not surface:
+            self._build_palette(surface)
+        columns = self.columns[:count]
+        rows = self.rows[:count]
+        shade_index = self.shade_index[:count]
+        color_index = self.color_index[:count]
+        live = self.live[:count]
+        self.live[positions] = self.x
+        np.copyto(columns, live, casting='unsafe')
+        self.live[positions] = self.y
+        np.copyto(rows, live, casting='unsafe')
+
+        # Shade: the fraction of its life left, as a fade level, in its color's row
+        np.divide(self.life, self.lifetime, out=values)
+        np.multiply(values, FADE_LEVELS - 1, out=values)
+        self.live[positions] = values
+        np.copyto(shade_index, live, casting='unsafe')
+        self.color_index[positions] = self.color
+        color_index *= FADE_LEVELS
+        shade_index += color_index
+        if surface.get_bytesize() in PIXEL_BYTES:
+            self._write_pixels(surface, columns, rows, shade_index)
+        else:
+            surface.blits(zip(map(self.palette.__getitem__, shade_index.tolist()),
+                              zip(columns.tolist(), rows.tolist())), False)
+
+        left = int(columns.min())
+        top = int(rows.min())
+        area = self.areas[self.areas_used % 2]
+        self.areas_used += 1
+        area.update(left, top, int(columns.max()) - left + DOT_SIZE,
+                    int(rows.max()) - top + DOT_SIZE)
+        return area
+
+    def _write_pixels(self, surface, columns, rows, shade_index):
+        shades = self.shades[:len(shade_index)]
+        np.take(self.palette, shade_index, out=shades, mode='clip')  # 'raise' buffers
+
+        # Into the surface's pixels as one flat array, a row every `pitch` items
+        pitch = surface.get_pitch() // surface.get_bytesize()
+        index = self.index[:len(shade_index)]
+        np.multiply(rows, pitch, out=index)
+        index += columns
+        buffer = surface.get_buffer()
+        try:
+            pixels = np.frombuffer(buffer, shades.dtype)
+            for _ in range(DOT_SIZE):
+                for _ in range(DOT_SIZE):
+                    pixels[index] = shades
+                    index += 1
+                index += pitch - DOT_SIZE
+            del pixels
+        finally:
+            del buffer  # unlocks the surface
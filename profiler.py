@@ -0,0 +1,192 @@
+"""Per-phase frame timings for the game loop, with an in-game overlay."""
+import csv
+import json
+import time
+from array import array
+
+import pygame
+
+# Timed phases, in the order the loop runs them. update() phases repeat
+# once per tick in the frame and their times add up.
+PHASES = (
+    'events',
+    'power_ups', 'movement', 'coins', 'obstacles', 'collisions',
+    'entities', 'particles', 'hud', 'notifications', 'game_over', 'overlay',
+    'present',
+)
+
+
+class NullProfiler:
+    """Profiler that records nothing. Game uses it when not given one."""
+    visible = False
+
+    def begin_frame(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+    def end_frame(self):
+        pass
+
+    def toggle(self):
+        pass
+
+
+class FrameProfiler(NullProfiler):
+    """Times each phase of a frame with perf_counter_ns().
+
+    The loop calls begin_frame() when a frame's work starts, lap(phase) at
+    the end of each phase and end_frame() after presenting. lap() charges
+    the time since the previous lap to `phase`. The last `capacity` frames
+    are kept in a ring buffer: one row per frame of phase times followed by
+    the frame total, all in nanoseconds.
+    """
+    def __init__(self, capacity=600, budget_ms=1000 / 60):
+        self.capacity = capacity
+        self.budget_ms = budget_ms
+        self.slots = {phase: i for i, phase in enumerate(PHASES)}
+        self.row_size = len(PHASES) + 1
+        self.samples = array('q', bytes(8 * capacity * self.row_size))
+        self.frames = 0  # frames recorded, including ones the buffer has dropped
+        self.zeros = (0,) * len(PHASES)
+        self.current = list(self.zeros)
+        self.frame_start = 0
+        self.last = 0
+
+        # Overlay: a scrolling frame-time graph plus text refreshed every
+        # `stats_interval` frames, so the numbers stay readable
+        self.visible = False
+        self.stats_interval = 30
+        self.stats_lines = []
+        self.graph = None
+
+    def begin_frame(self):
+        self.current[:] = self.zeros
+        self.frame_start = self.last = time.perf_counter_ns()
+
+    def lap(self, phase):
+        now = time.perf_counter_ns()
+        self.current[self.slots[phase]] += now - self.last
+        self.last = now
+
+    def end_frame(self):
+        samples = self.samples
+        row = (self.frames % self.capacity) * self.row_size
+        for i, value in enumerate(self.current):
+            samples[row + i] = value
+        total = time.perf_counter_ns() - self.frame_start
+        samples[row + len(PHASES)] = total
+        self.frames += 1
+
+        if self.visible:
+            if self.graph is not None:
+                self._plot(total)
+            if self.frames % self.stats_interval == 0:
+                self.stats_lines = self._stats_lines()
+
+    def rows(self):
+        """Recorded frames still in the buffer, oldest first."""
+        count = min(self.frames, self.capacity)
+        first = self.frames - count
+        rows = []
+        for frame in range(first, self.frames):
+            row = (frame % self.capacity) * self.row_size
+            rows.append(self.samples[row:row + self.row_size].tolist())
+        return rows
+
+    def summary(self):
+        """p50/p95/p99 frame time and mean time per phase, in ms."""
+        rows = self.rows()
+        if not rows:
+            return {'frames': 0}
+        totals = sorted(row[-1] for row in rows)
+        summary = {'frames': len(rows)}
+        for p in (50, 95, 99):
+            summary[f'p{p}_ms'] = percentile(totals, p) / 1e6
+        summary['max_ms'] = totals[-1] / 1e6
+        summary['phases_ms'] = {
+            phase: sum(row[i] for row in rows) / len(rows) / 1e6
+            for i, phase in enumerate(PHASES)
+        }
+        return summary
+
+    def export(self, path):
+        """Write the buffered frames to `path`, as JSON if it ends in .json, else CSV."""
+        rows = self.rows()
+        first = self.frames - len(rows)
+        if str(path).endswith('.json'):
+            with open(path, 'w') as f:
+                json.dump({
+                    'units': 'ns',
+                    'columns': ['frame', *PHASES, 'total'],
+                    'frames': [[first + i, *row] for i, row in enumerate(rows)],
+                    'summary': self.summary(),
+                }, f)
+        else:
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['frame', *(f'{phase}_ns' for phase in PHASES), 'total_ns'])
+                for i, row in enumerate(rows):
+                    writer.writerow([first + i, *row])
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.graph = None
+        if self.visible:
+            self.stats_lines = self._stats_lines()
+
+    def _stats_lines(self):
+        summary = self.summary()
+        if not summary['frames']:
+            return []
+        slowest = sorted(summary['phases_ms'].items(), key=lambda item: item[1], reverse=True)[:4]
+        return [
+            f"p50 {summary['p50_ms']:.2f}  p95 {summary['p95_ms']:.2f}  "
+            f"p99 {summary['p99_ms']:.2f} ms",
+            *(f"{phase} {ms:.3f} ms" for phase, ms in slowest),
+        ]
+
+    def _graph_y(self, total_ns):
+        # The graph's top is twice the frame budget
+        height = self.graph.get_height()
+        return height - min(height, int(total_ns / 1e6 / (2 * self.budget_ms) * height))
+
+    def _plot(self, total_ns):
+        # Scroll one pixel left and draw the newest frame in the last column
+        graph = self.graph
+        width, height = graph.get_size()
+        graph.scroll(-1, 0)
+        graph.fill((20, 20, 20), (width - 1, 0, 1, height))
+        over_budget = total_ns / 1e6 > self.budget_ms
+        graph.fill((255, 80, 80) if over_budget else (80, 200, 80),
+                   (width - 1, self._graph_y(total_ns), 1, height))
+        graph.set_at((width - 1, height // 2), (255, 255, 255))
+
+    def _build_graph(self, width, height):
+        self.graph = pygame.Surface((width, height))
+        self.graph.fill((20, 20, 20))
+        for row in self.rows()[-width:]:
+            self._plot(row[-1])
+
+    def draw(self, window, text_cache, rects):
+        """Draw the overlay in the bottom-left corner, adding its area to `rects`."""
+        width, height = 240, 60
+        line_height = 18
+        panel = pygame.Rect(0, 0, width + 10, height + 10 + line_height * len(self.stats_lines))
+        panel.bottomleft = (0, window.get_height())
+        if self.graph is None:
+            self._build_graph(width, height)
+
+        rects.append(window.fill((0, 0, 0), panel))
+        window.blit(self.graph, (panel.x + 5, panel.y + 5))
+        y = panel.y + height + 8
+        for line in self.stats_lines:
+            window.blit(text_cache.render(line, 20, (255, 255, 255)), (panel.x + 5, y))
+            y += line_height
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, -(-len(sorted_values) * p // 100) - 1)
+    return sorted_values[index]
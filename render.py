@@ -0,0 +1,85 @@
+"""Rendering caches shared by the game's draw code."""
+from collections import OrderedDict
+
+import pygame
+
+
+class TextCache:
+    """LRU cache of rendered text, keyed on (font size, text, color).
+
+    HUD strings like the score or health percentage rarely change between
+    frames, so each one is rendered once and reused until it changes. Font
+    objects are built on first use of a size; call clear() when the scale
+    changes so fonts and surfaces for the old sizes are dropped.
+    """
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            font = self.fonts[size] = pygame.font.Font(None, size)
+        return font
+
+    def render(self, text, size, color):
+        key = (size, text, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.font(size).render(text, True, color)
+            self.surfaces[key] = surface
+            if len(self.surfaces) > self.max_entries:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+
+    def clear(self):
+        self.fonts.clear()
+        self.surfaces.clear()
+
+
+class SpriteAtlas:
+    """Pre-rendered entity sprites, one surface per (shape, color, size).
+
+    Each sprite is rasterized once, converted to the display's pixel format
+    and then only blitted. Sizes follow the window scale, so clear() must be
+    called when the scale changes; sprites are rebuilt on next use.
+    Shapes are 'rect' (player, obstacles), 'circle' (coins) and 'diamond'
+    (power-ups), each filling a size x size box at the blit position.
+    """
+    def __init__(self):
+        self.sprites = {}
+
+    def get(self, shape, color, size):
+        key = (shape, color, size)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = self.sprites[key] = self._build(shape, color, size)
+        return sprite
+
+    def _build(self, shape, color, size):
+        # Converting needs a display mode; headless games keep the raw surface
+        converted = pygame.display.get_surface() is not None
+        if shape == 'rect':
+            sprite = pygame.Surface((size, size))
+            sprite.fill(color)
+            return sprite.convert() if converted else sprite
+
+        sprite = pygame.Surface((size + 1, size + 1), pygame.SRCALPHA)
+        if shape == 'circle':
+            pygame.draw.circle(sprite, color, (size // 2, size // 2), size // 2)
+        elif shape == 'diamond':
+            pygame.draw.polygon(sprite, color, [
+                (size // 2, 0),  # top
+                (size, size // 2),  # right
+                (size // 2, size),  # bottom
+                (0, size // 2)  # left
+            ])
+        else:
+            raise ValueError(f"unknown sprite shape: {shape}")
+        return sprite.convert_alpha() if converted else sprite
+
+    def clear(self):
+        self.sprites.clear()
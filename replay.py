@@ -0,0 +1,272 @@
+"""Record a game's input and play it back exactly.
+
+A game is fully determined by its seed (Game.rng), its starting window size
+and tick rate, the input read on every tick and the window events between
+ticks (resize, fullscreen, restart). A Recorder logs those while a game
+runs. The log plays back at uncapped speed with nothing drawn, or drawn at
+any speed, and reaches the recorded score and level.
+
+    python replay.py session.ccr                 # uncapped, check the result
+    python replay.py recordings/*.ccr            # many logs, as a benchmark
+    python replay.py session.ccr --speed 4       # watch at 4x
+
+The log format is binary and little-endian: a fixed header (see HEADER),
+then the input as run-length encoded varints of (run length << 2 | state)
+where state is left | right << 1, then the events as varints of (ticks
+since the previous event, kind, arguments).
+"""
+import argparse
+import struct
+import time
+
+import pygame
+
+from inputs import NO_INPUT, InputProvider, InputState
+
+MAGIC = b'CCRP'
+VERSION = 2  # 2: power-ups spawn from the spawns.py timeline, drawing the RNG differently
+# magic, version, flags, tick rate, width, height, seed, ticks, score, level
+HEADER = struct.Struct('<4sBBHHHQIQH')
+SWARM_FLAG = 1
+
+# Input states by code: left | right << 1
+STATES = (NO_INPUT, InputState(True, False), InputState(False, True), InputState(True, True))
+
+# Window events. RESIZE and FULLSCREEN carry the resulting window size.
+RESIZE, FULLSCREEN, RESET = range(3)
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class ReplayLog:
+    """Everything needed to replay one game, plus its result to check against."""
+    def __init__(self, seed, width, height, tick_rate, swarm=False):
+        self.seed = seed
+        self.width = width
+        self.height = height
+        self.tick_rate = tick_rate
+        self.swarm = swarm
+        self.runs = []  # [state, length] input runs
+        self.events = []  # (tick, kind, args), tick being Game.ticks when it happened
+        self.ticks = 0
+        self.score = 0
+        self.level = 1
+
+    def add_input(self, keys):
+        state = bool(keys.left) | bool(keys.right) << 1
+        if self.runs and self.runs[-1][0] == state:
+            self.runs[-1][1] += 1
+        else:
+            self.runs.append([state, 1])
+
+    def inputs(self):
+        for state, length in self.runs:
+            for _ in range(length):
+                yield STATES[state]
+
+    def to_bytes(self):
+        out = bytearray(HEADER.pack(MAGIC, VERSION, SWARM_FLAG if self.swarm else 0,
+                                    self.tick_rate, self.width, self.height, self.seed,
+                                    self.ticks, self.score, self.level))
+        _write_varint(out, len(self.runs))
+        for state, length in self.runs:
+            _write_varint(out, length << 2 | state)
+        _write_varint(out, len(self.events))
+        previous = 0
+        for tick, kind, args in self.events:
+            _write_varint(out, tick - previous)
+            _write_varint(out, kind)
+            for arg in args:
+                _write_varint(out, arg)
+            previous = tick
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        (magic, version, flags, tick_rate, width, height, seed,
+         ticks, score, level) = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("not a Coin Collector replay")
+        if version != VERSION:
+            raise ValueError(f"unsupported replay version {version}")
+        log = cls(seed, width, height, tick_rate, bool(flags & SWARM_FLAG))
+        log.ticks, log.score, log.level = ticks, score, level
+
+        pos = HEADER.size
+        count, pos = _read_varint(data, pos)
+        for _ in range(count):
+            run, pos = _read_varint(data, pos)
+            log.runs.append([run & 3, run >> 2])
+        count, pos = _read_varint(data, pos)
+        tick = 0
+        for _ in range(count):
+            delta, pos = _read_varint(data, pos)
+            kind, pos = _read_varint(data, pos)
+            args = []
+            for _ in range(2 if kind in (RESIZE, FULLSCREEN) else 0):
+                arg, pos = _read_varint(data, pos)
+                args.append(arg)
+            tick += delta
+            log.events.append((tick, kind, tuple(args)))
+        return log
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+class Recorder(InputProvider):
+    """Logs a game's input and window events from its first tick.
+
+    Wraps the game's input provider, so attach it before the game is
+    updated; save() stores the log with the game's current result.
+    """
+    def __init__(self, game):
+        if game.ticks:
+            raise ValueError("a recording has to start before the game's first tick")
+        self.game = game
+        self.log = ReplayLog(game.seed, game.width, game.height, game.tick_rate, game.swarm)
+        self.input_provider = game.input_provider
+        game.input_provider = self
+        game.recorder = self
+
+    def read(self, game):
+        keys = self.input_provider.read(game)
+        self.log.add_input(keys)
+        return keys
+
+    # Called by Game after the event has been applied
+    def resize(self, game):
+        self.log.events.append((game.ticks, RESIZE, (game.width, game.height)))
+
+    def fullscreen(self, game):
+        self.log.events.append((game.ticks, FULLSCREEN, (game.width, game.height)))
+
+    def reset(self, game):
+        self.log.events.append((game.ticks, RESET, ()))
+
+    def save(self, path):
+        log = self.log
+        log.ticks, log.score, log.level = self.game.ticks, self.game.score, self.game.level
+        log.save(path)
+
+
+class ReplayInput(InputProvider):
+    """Feeds a game the recorded input and applies the recorded window events."""
+    def __init__(self, log):
+        self.inputs = log.inputs()
+        self.events = log.events
+        self.next_event = 0
+
+    def read(self, game):
+        return next(self.inputs, NO_INPUT)
+
+    def apply_events(self, game):
+        """Apply the events recorded before the game's next tick."""
+        events = self.events
+        while self.next_event < len(events) and events[self.next_event][0] <= game.ticks:
+            _, kind, args = events[self.next_event]
+            self.next_event += 1
+            if kind == RESIZE:
+                game.handle_resize(args)
+            elif kind == FULLSCREEN:
+                game.toggle_fullscreen(args)
+            else:
+                game.reset_game()
+
+
+def new_game(log, window=None):
+    # main imports this module to record, so it is imported here on use
+    from main import Game
+    return Game(window, ReplayInput(log), width=log.width, height=log.height,
+                tick_rate=log.tick_rate, swarm=log.swarm, seed=log.seed)
+
+
+def play(log, window=None, speed=None, fps=60):
+    """Replay `log` and return the game.
+
+    Without a `speed` every tick runs back to back and nothing is drawn.
+    With one the game is drawn to `window`, or a new window, at `speed`
+    times real time; closing the window stops early.
+    """
+    if speed is not None and window is None:
+        from main import init_display
+        window = init_display((log.width, log.height), "Coin Collector replay")
+    game = new_game(log, window)
+    replay = game.input_provider
+    if speed is None:
+        for _ in range(log.ticks):
+            replay.apply_events(game)
+            game.update()
+        replay.apply_events(game)
+        return game
+
+    clock = pygame.time.Clock()
+    accumulator = 0.0
+    while game.ticks < log.ticks:
+        accumulator += min(clock.tick(fps), 250) * speed
+        if pygame.event.peek(pygame.QUIT):
+            break
+        pygame.event.pump()
+        while accumulator >= game.tick_ms and game.ticks < log.ticks:
+            replay.apply_events(game)
+            game.update()
+            accumulator -= game.tick_ms
+        game.draw(min(1.0, accumulator / game.tick_ms))
+    replay.apply_events(game)
+    return game
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded Coin Collector games")
+    parser.add_argument('paths', nargs='+', metavar='replay')
+    parser.add_argument('--speed', type=float, default=None,
+                        help="draw the first replay at this multiple of real time")
+    args = parser.parse_args()
+
+    if args.speed is not None:
+        game = play(ReplayLog.load(args.paths[0]), speed=args.speed)
+        print(f"score {game.score} at level {game.level} after {game.ticks} ticks")
+        return
+
+    desynced = []
+    total_ticks = 0
+    start = time.perf_counter()
+    for path in args.paths:
+        log = ReplayLog.load(path)
+        game = play(log)
+        total_ticks += game.ticks
+        if (game.ticks, game.score, game.level) != (log.ticks, log.score, log.level):
+            desynced.append(path)
+            print(f"{path}: DESYNC, recorded score {log.score} at level {log.level}, "
+                  f"replayed {game.score} at level {game.level}")
+    elapsed = time.perf_counter() - start
+    print(f"{len(args.paths) - len(desynced)}/{len(args.paths)} replays match, "
+          f"{total_ticks} ticks in {elapsed:.3f}s ({total_ticks / elapsed:,.0f} ticks/sec)")
+    if desynced:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
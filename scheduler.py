@@ -0,0 +1,36 @@
+"""Timed game events on the game's tick clock."""
+import heapq
+
+
+class Scheduler:
+    """A priority queue of events, each due on a game tick.
+
+    Events are plain data, (due tick, sequence, kind, args), so the queue
+    can be copied or saved as it is. Events due on the same tick come out
+    in the order they were scheduled. The clock is whatever tick count the
+    owner passes to due(), so time only passes while the game updates:
+    a paused or minimized game doesn't age its timers.
+    """
+    def __init__(self):
+        self.queue = []
+        self.sequence = 0
+
+    def __len__(self):
+        return len(self.queue)
+
+    def schedule(self, tick, kind, *args):
+        heapq.heappush(self.queue, (tick, self.sequence, kind, args))
+        self.sequence += 1
+
+    def due(self, tick):
+        """Pop and yield (kind, args) of every event due by `tick`.
+
+        Events scheduled while iterating are yielded too if they are due.
+        """
+        queue = self.queue
+        while queue and queue[0][0] <= tick:
+            _, _, kind, args = heapq.heappop(queue)
+            yield kind, args
+
+    def clear(self):
+        self.queue.clear()
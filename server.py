@@ -0,0 +1,358 @@
+"""Host many headless games in one process, played over the network.
+
+    python server.py --port 8765                  # serve until interrupted
+    python server.py --bench 300 --seconds 10     # 300 localhost bots, report the load
+
+Clients connect over TCP and speak newline-delimited JSON. Every connection
+gets its own Game, simulated by the server, so scores on the leaderboard
+are the server's own. After a greeting with the session's id, seed, size
+and tick rate, the client sends its keys whenever they change, and a few
+requests:
+
+    {"left": true, "right": false}
+    {"reset": true}                  # new game after game over
+    {"pause": true}                  # or false
+
+and every `send_every` ticks receives the fields of the state (see
+game_state()) that changed since the last message it was sent. With
+--format binary the state comes as statestream.py frames instead, right
+after the greeting line, and nothing else follows; there is no
+leaderboard message, the game over flag is in the frames.
+
+All sessions tick together on one clock: on every tick, each session in
+play runs one update(), back to back. A session that is over, paused, or
+hasn't heard from its client for `idle_seconds` leaves the tick loop until
+its client says something, so it costs nothing, and with no session in
+play the loop sleeps until there is one.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from inputs import NO_INPUT, InputProvider, InputState
+from main import TICK_RATE, Game
+from statestream import FrameReader, StateDecoder, StateEncoder
+
+LEADERBOARD_SIZE = 10
+MAX_LAG_TICKS = 30  # further behind than this, the clock skips ahead instead of catching up
+MAX_WRITE_BUFFER = 64 * 1024  # skip sending to clients that have this much unread
+BACKLOG = 1024  # connections waiting to be accepted; asyncio's default of 100 stalls bursts
+
+
+class RemoteInput(InputProvider):
+    """The keys a client last sent."""
+    def __init__(self):
+        self.keys = NO_INPUT
+
+    def read(self, game):
+        return self.keys
+
+
+def game_state(game):
+    """What clients are sent, as JSON-ready values."""
+    now = game.time_ms
+    return {
+        'tick': game.ticks,
+        'score': game.score,
+        'level': game.level,
+        'health': game.current_health,
+        'player': round(game.player_x, 1),
+        'coins': [[coin.x, round(coin.y, 1)] for coin in game.coins],
+        'obstacles': [[obstacle.x, round(obstacle.y, 1)] for obstacle in game.obstacles],
+        'power_ups': [[power_up.x, round(power_up.y, 1), power_up.type]
+                      for power_up in game.power_ups],
+        'active': {power_up_type: round(power_up.time_remaining(now), 1)
+                   for power_up_type, power_up in game.active_power_ups.items()
+                   if power_up is not None},
+        'game_over': game.game_over,
+    }
+
+
+class Session:
+    """One client's connection and game, sent as JSON or, with an encoder, binary frames."""
+    def __init__(self, number, game, writer, encoder=None):
+        self.number = number
+        self.game = game
+        self.input = game.input_provider
+        self.writer = writer
+        self.encoder = encoder
+        self.sent = {}  # state as of the last JSON message
+        self.last_heard = 0  # server tick
+        self.paused = False
+        self.idle = False
+
+    def send(self, message):
+        data = json.dumps(message, separators=(',', ':')).encode() + b'\n'
+        self.writer.write(data)
+        return len(data)
+
+    def send_state(self, force=False):
+        """Send what changed and return the bytes sent. Slow readers are
+        skipped until they catch up, before anything is diffed."""
+        if not force and self.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            return 0
+        if self.encoder is not None:
+            with self.encoder.encode(self.game) as frame:
+                data = bytes(frame)  # the transport may hold on to what it's given
+            self.writer.write(data)
+            return len(data)
+        state = game_state(self.game)
+        sent = self.sent
+        changes = {name: value for name, value in state.items() if sent.get(name) != value}
+        if not changes:
+            return 0
+        self.sent = state
+        return self.send(changes)
+
+
+class GameServer:
+    """Accepts clients and ticks their games on a shared clock."""
+    def __init__(self, tick_rate=TICK_RATE, send_every=3, idle_seconds=60, seed=None,
+                 binary=False):
+        self.tick_rate = tick_rate
+        self.binary = binary
+        self.send_every = send_every
+        self.idle_ticks = idle_seconds * tick_rate
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self.ticks = 0
+        self.sessions = 0  # ever connected, numbering them
+        self.playing = {}  # session number: Session, for those in the tick loop
+        self.wake = asyncio.Event()
+        self.leaderboard = []  # [score, level, session number], best first
+
+        # Load statistics, for --bench
+        self.tick_work = 0.0  # seconds spent in tick()
+        self.updates = 0
+        self.games_over = 0
+        self.skipped_ticks = 0
+        self.bytes_sent = 0
+
+    async def handle_client(self, reader, writer):
+        self.sessions += 1
+        number = self.sessions
+        game = Game(input_provider=RemoteInput(), seed=self.seed + number)
+        session = Session(number, game, writer, StateEncoder() if self.binary else None)
+        session.last_heard = self.ticks
+        session.send({'session': number, 'seed': game.seed, 'width': game.width,
+                      'height': game.height, 'tick_rate': game.tick_rate,
+                      'format': 'binary' if self.binary else 'json'})
+        self.bytes_sent += session.send_state(force=True)
+        self.set_playing(session)
+        try:
+            async for line in reader:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(message, dict):
+                    self.receive(session, message)
+        except ConnectionError:
+            pass
+        finally:
+            self.playing.pop(number, None)
+            writer.close()
+
+    def receive(self, session, message):
+        session.last_heard = self.ticks
+        session.idle = False
+        if 'left' in message or 'right' in message:
+            session.input.keys = InputState(bool(message.get('left')), bool(message.get('right')))
+        if 'pause' in message:
+            session.paused = bool(message['pause'])
+        if message.get('reset') and session.game.game_over:
+            session.game.reset_game()
+            self.bytes_sent += session.send_state()
+        self.set_playing(session)
+
+    def set_playing(self, session):
+        if session.game.game_over or session.paused or session.idle:
+            self.playing.pop(session.number, None)
+        elif session.number not in self.playing:
+            self.playing[session.number] = session
+            self.wake.set()
+
+    def tick(self):
+        self.ticks += 1
+        send = self.ticks % self.send_every == 0
+        stopped = []
+        for session in self.playing.values():
+            session.game.update()
+            if session.game.game_over:
+                stopped.append(session)
+            elif self.ticks - session.last_heard > self.idle_ticks:
+                session.idle = True
+                stopped.append(session)
+            elif send:
+                self.bytes_sent += session.send_state()
+        self.updates += len(self.playing)
+        for session in stopped:
+            del self.playing[session.number]
+            self.bytes_sent += session.send_state(force=True)
+            if session.game.game_over:
+                self.record_score(session)
+
+    def record_score(self, session):
+        game = session.game
+        self.games_over += 1
+        self.leaderboard.append([game.score, game.level, session.number])
+        self.leaderboard.sort(reverse=True)
+        del self.leaderboard[LEADERBOARD_SIZE:]
+        if session.encoder is None:
+            self.bytes_sent += session.send({'leaderboard': self.leaderboard})
+
+    async def run(self):
+        """Tick every session in play, tick_rate times a second, forever."""
+        loop = asyncio.get_running_loop()
+        tick_seconds = 1 / self.tick_rate
+        next_tick = loop.time()
+        while True:
+            if not self.playing:
+                self.wake.clear()
+                await self.wake.wait()
+                next_tick = loop.time()
+            start = time.perf_counter()
+            self.tick()
+            self.tick_work += time.perf_counter() - start
+
+            next_tick += tick_seconds
+            delay = next_tick - loop.time()
+            if delay < -MAX_LAG_TICKS * tick_seconds:
+                self.skipped_ticks += int(-delay / tick_seconds)
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(max(delay, 0))  # let the clients' reads in either way
+
+
+def chase(coins, player_x, rng):
+    """Keys toward the lowest of (x, y) `coins`, for a player at `player_x`."""
+    coin_x = max(coins, key=lambda coin: coin[1])[0] + 10
+    player_x += 25 + rng.uniform(-5, 5)
+    return coin_x < player_x - 5, coin_x > player_x + 5
+
+
+async def bot_client(host, port, stop, rng):
+    """A localhost player for --bench that chases the lowest coin and restarts when it loses."""
+    reader, writer = await asyncio.open_connection(host, port)
+    keys = None
+
+    def press(wanted):
+        nonlocal keys
+        if wanted != keys:
+            keys = wanted
+            writer.write(json.dumps({'left': keys[0], 'right': keys[1]}).encode() + b'\n')
+
+    try:
+        greeting = json.loads(await reader.readline())
+        if greeting['format'] == 'binary':
+            frames = FrameReader()
+            decoder = StateDecoder()
+            game_over = False
+            while not stop.is_set():
+                data = await reader.read(65536)
+                if not data:
+                    break
+                for frame in frames.feed(data):
+                    decoder.decode(frame)
+                if decoder.game_over:
+                    if not game_over:
+                        writer.write(b'{"reset":true}\n')
+                elif decoder.coins:
+                    coins = decoder.coins
+                    press(chase(zip(coins[0::2], coins[1::2]), decoder.player_x, rng))
+                game_over = decoder.game_over
+            return
+
+        state = {}
+        while not stop.is_set():
+            line = await reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            state.update(message)
+            if 'coins' not in state:
+                continue
+            if state.get('game_over'):
+                if 'leaderboard' in message:
+                    writer.write(b'{"reset":true}\n')
+                continue
+            press(chase(state['coins'], state['player'], rng))
+    finally:
+        writer.close()
+
+
+async def bench(server, clients, seconds, host='127.0.0.1'):
+    """Play `clients` bots against the server for `seconds` and report its load."""
+    listener = await asyncio.start_server(server.handle_client, host, 0, backlog=BACKLOG)
+    port = listener.sockets[0].getsockname()[1]
+    stop = asyncio.Event()
+    runner = asyncio.create_task(server.run())
+    bots = [asyncio.create_task(bot_client(host, port, stop, random.Random(i)))
+            for i in range(clients)]
+    while server.sessions < clients:
+        await asyncio.sleep(0.1)
+
+    ticks, work, updates, sent = server.ticks, server.tick_work, server.updates, server.bytes_sent
+    start = time.perf_counter()
+    await asyncio.sleep(seconds)
+    elapsed = time.perf_counter() - start
+    ticks, work, updates = server.ticks - ticks, server.tick_work - work, server.updates - updates
+    sent = server.bytes_sent - sent
+
+    stop.set()
+    runner.cancel()
+    for bot in bots:
+        bot.cancel()
+    listener.close()
+    await asyncio.gather(runner, *bots, return_exceptions=True)
+
+    budget = 1 / server.tick_rate
+    per_tick = work / max(ticks, 1)
+    print(f"{clients} sessions, {ticks} ticks in {elapsed:.1f}s "
+          f"({ticks / elapsed:.1f}/s of {server.tick_rate}), {server.skipped_ticks} skipped")
+    print(f"{updates:,} game updates; tick work {per_tick * 1000:.2f} ms of "
+          f"{budget * 1000:.1f} ms ({per_tick / budget:.0%}), "
+          f"{per_tick / max(updates / max(ticks, 1), 1) * 1e6:.1f} us per session")
+    print(f"{sent / elapsed / 1024:,.0f} KiB/s sent, "
+          f"{sent / max(updates, 1) * server.send_every:.0f} bytes per session per message")
+    if server.leaderboard:
+        best_score, best_level, _ = server.leaderboard[0]
+        print(f"{server.games_over} games over, best score {best_score} at level {best_level}")
+
+
+async def serve(server, host, port):
+    listener = await asyncio.start_server(server.handle_client, host, port, backlog=BACKLOG)
+    print(f"serving on {', '.join(str(s.getsockname()) for s in listener.sockets)}")
+    async with listener:
+        await asyncio.gather(listener.serve_forever(), server.run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Coin Collector games over TCP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, default=None, help="session n plays seed + n")
+    parser.add_argument('--send-every', type=int, default=3, help="ticks between state messages")
+    parser.add_argument('--format', choices=['json', 'binary'], default='json',
+                        help="how the state is sent (binary: see statestream.py)")
+    parser.add_argument('--idle-seconds', type=float, default=60,
+                        help="pause sessions whose client has been silent this long")
+    parser.add_argument('--bench', type=int, metavar='CLIENTS',
+                        help="instead of serving, play this many localhost bots and report")
+    parser.add_argument('--seconds', type=float, default=10, help="length of --bench")
+    args = parser.parse_args()
+
+    server = GameServer(send_every=args.send_every, idle_seconds=args.idle_seconds,
+                        seed=args.seed, binary=args.format == 'binary')
+    try:
+        if args.bench:
+            asyncio.run(bench(server, args.bench, args.seconds))
+        else:
+            asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
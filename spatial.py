@@ -0,0 +1,65 @@
+"""Uniform-grid broadphase for collisions against the player."""
+
+
+class SpatialHash:
+    """Buckets entities by the grid cell their top-left corner is in.
+
+    Entities need `x`, `y` and a `cell` slot where the hash keeps the key
+    of the cell they are filed under. The hash has to be told when one is
+    added, moved or removed. Falling objects only change cell every
+    cell_size pixels, so most move() calls are a comparison.
+    """
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _key(self, entity):
+        # Truncate like pygame.Rect so cells agree with collision rects
+        return int(entity.x) // self.cell_size, int(entity.y) // self.cell_size
+
+    def insert(self, entity):
+        key = entity.cell = self._key(entity)
+        self.cells.setdefault(key, []).append(entity)
+        self.count += 1
+
+    def remove(self, entity):
+        self._unlink(entity, entity.cell)
+        entity.cell = None
+        self.count -= 1
+
+    def move(self, entity):
+        key = self._key(entity)
+        if key != entity.cell:
+            self._unlink(entity, entity.cell)
+            entity.cell = key
+            self.cells.setdefault(key, []).append(entity)
+
+    def _unlink(self, entity, key):
+        cell = self.cells[key]
+        for i, other in enumerate(cell):
+            if other is entity:
+                cell[i] = cell[-1]
+                cell.pop()
+                break
+        if not cell:
+            del self.cells[key]
+
+    def query(self, rect, max_size):
+        """Entities that may overlap `rect`, if none is larger than max_size."""
+        cell_size = self.cell_size
+        cells = self.cells
+        candidates = []
+        for col in range((rect.x - max_size) // cell_size, rect.right // cell_size + 1):
+            for row in range((rect.y - max_size) // cell_size, rect.bottom // cell_size + 1):
+                cell = cells.get((col, row))
+                if cell:
+                    candidates.extend(cell)
+        return candidates
+
+    def clear(self):
+        self.cells.clear()
+        self.count = 0
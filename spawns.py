@@ -0,0 +1,201 @@
+"""What spawns on each level, and when.
+
+SpawnDirector compiles the game's spawn settings (entity caps, power-up
+unlock levels and spawn chance), plus any rules authored for a particular
+level, into one LevelRules per level the first time the level is played.
+The game reads coin and obstacle counts and the power-ups it can drop from
+there instead of working them out again on every spawn. Only the last
+few levels' rules are kept, as a game only ever plays one level at a time.
+
+Power-ups arrive at random with a fixed chance per tick. Rather than
+rolling for one every tick, the wait until the next one is drawn once,
+from the geometric distribution, which gives the same spawns on average
+for one draw per power-up. The game only ever holds the next spawn, as an
+event in its Scheduler, so the timeline is generated as it goes and stays
+plain data that Game.snapshot() can save. Authored waves are dropped from
+the same timeline.
+
+    python spawns.py --levels 12              # the compiled table
+    python spawns.py --level 7 --seconds 60   # a preview of one level's spawns
+"""
+import argparse
+import heapq
+import math
+import random
+from collections import OrderedDict
+from operator import itemgetter
+
+# Rules that can be authored for a level (see SpawnDirector.set_level)
+LEVEL_SETTINGS = ('max_coins', 'max_obstacles', 'power_up_chance', 'waves')
+
+
+class Wave:
+    """Power-ups dropped in a pattern, `at` milliseconds into a level.
+
+    One drops above each of `columns`, given as fractions of the play width
+    from the left edge, each `spacing` ms after the one before. `power_up`
+    is the type dropped, or None for a random unlocked one each time.
+    """
+    def __init__(self, at, columns, power_up=None, spacing=0):
+        self.at = at
+        self.columns = tuple(columns)
+        self.power_up = power_up
+        self.spacing = spacing
+
+
+class LevelRules:
+    """Everything about spawning on one level, worked out once.
+
+    `power_ups` is the level's row of the unlock table: the power-up types
+    that can spawn, in unlock table order. `unlocked` is the types that
+    first become available on this level. `drops` are the level's waves as
+    (ticks after the level starts, column, power-up type), in time order.
+    """
+    __slots__ = ('level', 'max_coins', 'max_obstacles', 'power_ups', 'unlocked',
+                 'power_up_chance', 'log_miss', 'drops')
+
+    def gap(self, rng):
+        """Ticks until the next power-up, at least one; None if none spawn."""
+        if self.power_up_chance <= 0:
+            return None
+        if self.power_up_chance >= 1:
+            return 1
+        # Inverse transform: the number of ticks up to and including the
+        # first one whose roll would have spawned
+        return int(math.log(1.0 - rng.random()) / self.log_miss) + 1
+
+
+class SpawnDirector:
+    """Compiles a game's spawn settings into LevelRules, level by level.
+
+    Settings are read from the game when a level is first compiled, so
+    changes made before the game starts (as sweep.py does) take effect;
+    after that, call clear() to have levels compiled again. The rules of
+    the `keep` most recently used levels are cached, or of every level if
+    `keep` is None.
+    """
+    def __init__(self, game, keep=2):
+        self.game = game
+        self.keep = keep
+        self.levels = OrderedDict()
+        self.authored = {}  # level -> {setting: value}
+
+    def rules(self, level):
+        rules = self.levels.get(level)
+        if rules is None:
+            rules = self.levels[level] = self.compile(level)
+            if self.keep is not None and len(self.levels) > self.keep:
+                self.levels.popitem(last=False)
+        else:
+            self.levels.move_to_end(level)
+        return rules
+
+    def set_level(self, level, **settings):
+        """Author rules for one level, over the ones the settings give it.
+
+        Takes any of LEVEL_SETTINGS, e.g. max_coins=30 for a denser level or
+        waves=[Wave(2000, [0.2, 0.5, 0.8])]. Entities added by a denser level
+        stay for the rest of the game, like the ones a level-up adds.
+        """
+        for name in settings:
+            if name not in LEVEL_SETTINGS:
+                raise TypeError(f"no level setting called {name!r}")
+        self.authored.setdefault(level, {}).update(settings)
+        self.levels.pop(level, None)
+
+    def clear(self):
+        self.levels.clear()
+
+    def compile(self, level):
+        game = self.game
+        authored = self.authored.get(level, {})
+        rules = LevelRules()
+        rules.level = level
+
+        # Counts grow with the level up to the caps
+        multiplier = game.entity_multiplier
+        rules.max_coins = authored.get(
+            'max_coins', min(game.max_coins, (1 + level // 3) * multiplier))
+        rules.max_obstacles = authored.get(
+            'max_obstacles', min(game.max_obstacles, (1 + level // 4) * multiplier))
+
+        unlock_levels = game.powerup_unlock_levels
+        rules.power_ups = tuple(power_up_type for power_up_type, unlock_level
+                                in unlock_levels.items() if level >= unlock_level)
+        rules.unlocked = tuple(power_up_type for power_up_type, unlock_level
+                               in unlock_levels.items() if unlock_level == level)
+
+        chance = rules.power_up_chance = authored.get('power_up_chance',
+                                                      game.power_up_spawn_chance)
+        rules.log_miss = math.log1p(-chance) if 0 < chance < 1 else None
+
+        drops = [(game.ticks_for(wave.at + i * wave.spacing), column, wave.power_up)
+                 for wave in authored.get('waves', ()) for i, column in enumerate(wave.columns)]
+        drops.sort(key=itemgetter(0))
+        rules.drops = tuple(drops)
+        return rules
+
+    def timeline(self, level, rng, start=0):
+        """Yield (tick, power-up type, column) for every spawn of one level
+        started on tick `start`, as the game would schedule them: forever,
+        or until its waves are over if nothing can spawn at random.
+
+        The column is None for spawns at a random position. Types are drawn
+        from `rng` as they come, so the game's own spawns, which share its
+        generator with everything else, will differ in detail.
+        """
+        rules = self.rules(level)
+        drops = [(start + offset, i, column, power_up_type)
+                 for i, (offset, column, power_up_type) in enumerate(rules.drops)]
+        gap = rules.gap(rng) if rules.power_ups else None
+        next_spawn = None if gap is None else start + gap
+        while drops or next_spawn is not None:
+            if drops and (next_spawn is None or drops[0][0] <= next_spawn):
+                tick, _, column, power_up_type = heapq.heappop(drops)
+            else:
+                tick, column, power_up_type = next_spawn, None, None
+                gap = rules.gap(rng)
+                next_spawn += gap
+            if power_up_type is None:
+                if not rules.power_ups:
+                    continue
+                power_up_type = rng.choice(rules.power_ups)
+            yield tick, power_up_type, column
+
+
+def print_table(director, levels):
+    print(f"{'level':>5}  {'coins':>5}  {'obstacles':>9}  {'chance':>6}  {'drops':>5}  power-ups")
+    for level in range(1, levels + 1):
+        rules = director.rules(level)
+        print(f"{level:>5}  {rules.max_coins:>5}  {rules.max_obstacles:>9}  "
+              f"{rules.power_up_chance:>6.3f}  {len(rules.drops):>5}  {', '.join(rules.power_ups)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show Coin Collector's spawn rules")
+    parser.add_argument('--levels', type=int, default=10, help="levels in the table")
+    parser.add_argument('--level', type=int, help="preview this level's spawns instead")
+    parser.add_argument('--seconds', type=float, default=60, help="length of the preview")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--swarm', action='store_true', help="use swarm-mode entity counts")
+    args = parser.parse_args()
+
+    from main import Game
+    game = Game(swarm=args.swarm)
+    if args.level is None:
+        print_table(game.spawns, args.levels)
+        return
+
+    end = game.ticks_for(args.seconds * 1000)
+    count = 0
+    for tick, power_up_type, column in game.spawns.timeline(args.level, random.Random(args.seed)):
+        if tick > end:
+            break
+        where = 'random' if column is None else f"column {column:.2f}"
+        print(f"{tick * game.tick_ms / 1000:7.2f}s  {power_up_type:<15} {where}")
+        count += 1
+    print(f"{count} power-ups in {args.seconds:g}s")
+
+
+if __name__ == '__main__':
+    main()
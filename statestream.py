@@ -0,0 +1,423 @@
+"""A compact binary stream of what a game shows, for spectators and telemetry.
+
+    python statestream.py --ticks 3600 --seed 1    # sizes compared to JSON
+
+A StateEncoder turns a Game into one frame per call, and a StateDecoder
+fed the same frames in order rebuilds the state a viewer needs: tick,
+score, level, health, game over and invulnerability, the player's x, coin
+and obstacle positions, falling power-ups and the time left on active ones.
+It isn't a save: the random generator and timers aren't in it (see
+Game.snapshot() for that).
+
+Every frame starts with FRAME: its size in bytes, not counting the size
+field, its kind and the game tick. A keyframe holds the whole state; a
+delta holds a mask of the parts that changed since the previous frame and
+only those. Coin and obstacle deltas are a bitmap of the entities that
+moved followed by one (dx, dy) byte pair each, or ESCAPE and the new
+position when the move doesn't fit in a byte. Positions are quantized to
+the 800x600 base resolution, as signed 16-bit integers, and the encoder
+diffs against what it sent rather than the exact positions, so rounding
+never adds up. Entity counts are 16-bit and the time left on a power-up
+32-bit, in tenths of a second; a state that doesn't fit, like a frame
+over 64 KiB, raises ValueError. All values are little-endian.
+
+The encoder writes into a buffer it keeps between frames and returns a
+memoryview of it, valid until the next encode(): copy it with bytes() to
+keep it, and release it or let it go before encoding again. The decoder
+keeps the state in arrays it updates in place.
+"""
+import argparse
+import json
+import struct
+import sys
+from array import array
+
+from main import (BASE_HEIGHT, BASE_WIDTH, POWERUP_DOUBLE_POINTS, POWERUP_HEALTH,
+                  POWERUP_INVINCIBLE, POWERUP_SLOW_OBSTACLES)
+
+KEYFRAME, DELTA = range(2)
+# size of the rest of the frame, kind, tick
+FRAME = struct.Struct('<HBI')
+# score, level, health, flags, player x
+SCALARS = struct.Struct('<IHBBh')
+MASK = struct.Struct('<B')
+COUNT = struct.Struct('<H')
+POSITION = struct.Struct('<hh')
+MOVE = struct.Struct('<bb')
+POWER_UP = struct.Struct('<hhB')
+# type code, tenths of a second left
+ACTIVE = struct.Struct('<BI')
+MAX_TENTHS = 2 ** 32 - 1  # longer times left are sent as this
+ESCAPE = -128  # in place of dx: an absolute POSITION follows
+
+# Delta mask bits
+SCALARS_CHANGED, COINS_CHANGED, OBSTACLES_CHANGED, POWER_UPS_CHANGED, ACTIVE_CHANGED = (
+    1, 2, 4, 8, 16)
+# Entity section modes in a delta
+FULL, MOVES = range(2)
+# Scalar flags
+GAME_OVER, INVULNERABLE = 1, 2
+
+POWERUP_TYPES = (POWERUP_INVINCIBLE, POWERUP_DOUBLE_POINTS, POWERUP_HEALTH, POWERUP_SLOW_OBSTACLES)
+POWERUP_CODES = {power_up_type: code for code, power_up_type in enumerate(POWERUP_TYPES)}
+
+LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+def _quantize(entities, scale_x, scale_y, out):
+    """Entity positions into `out` as base-resolution (x, y) pairs."""
+    count = 2 * len(entities)
+    if len(out) > count:
+        del out[count:]
+    elif len(out) < count:
+        out.frombytes(bytes(2 * (count - len(out))))
+    i = 0
+    for entity in entities:
+        out[i] = round(entity.x * scale_x)
+        out[i + 1] = round(entity.y * scale_y)
+        i += 2
+
+
+def _copy_positions(buffer, pos, positions):
+    """Write an array('h') as little-endian int16s at `pos`; returns the new end."""
+    end = pos + 2 * len(positions)
+    if LITTLE_ENDIAN:
+        buffer[pos:end] = memoryview(positions).cast('B')
+    else:
+        swapped = array('h', positions)
+        swapped.byteswap()
+        buffer[pos:end] = swapped.tobytes()
+    return end
+
+
+def _read_positions(frame, pos, count, positions):
+    """Read `count` positions at `pos` into an array('h'); returns the new position."""
+    end = pos + 4 * count
+    del positions[:]
+    positions.frombytes(frame[pos:end])
+    if not LITTLE_ENDIAN:
+        positions.byteswap()
+    return end
+
+
+class StateEncoder:
+    """Encodes a game's state, frame by frame, against the previous frame.
+
+    A keyframe goes out every `keyframe_interval` frames, and on the next
+    frame after request_keyframe(), e.g. when a spectator joins.
+    """
+    def __init__(self, keyframe_interval=60):
+        self.keyframe_interval = keyframe_interval
+        self.frames = 0
+        self.keyframe_due = True
+        self.buffer = bytearray(256)
+
+        # What the last frame said, to diff against
+        self.scalars = None
+        self.coins = array('h')
+        self.obstacles = array('h')
+        self.power_ups = []  # (x, y, type code)
+        self.active = []  # (type code, tenths of a second left)
+
+        # This frame, quantized
+        self.current_coins = array('h')
+        self.current_obstacles = array('h')
+
+    def request_keyframe(self):
+        self.keyframe_due = True
+
+    def _reserve(self, size):
+        if len(self.buffer) < size:
+            self.buffer.extend(bytes(max(size, 2 * len(self.buffer)) - len(self.buffer)))
+
+    def encode(self, game):
+        """The next frame, as a memoryview valid until the next call.
+
+        Raises ValueError if a value doesn't fit its field; the next frame
+        is then a keyframe.
+        """
+        try:
+            return self._encode(game)
+        except struct.error as exc:
+            self.keyframe_due = True
+            raise ValueError(f"tick {game.ticks} doesn't fit the stream: {exc}") from None
+
+    def _encode(self, game):
+        scale_x = BASE_WIDTH / game.width
+        scale_y = BASE_HEIGHT / game.height
+        flags = (GAME_OVER if game.game_over else 0) | (INVULNERABLE if game.invulnerable else 0)
+        scalars = (game.score, game.level, game.current_health, flags,
+                   round(game.player_x * scale_x))
+        coins = self.current_coins
+        obstacles = self.current_obstacles
+        _quantize(game.coins, scale_x, scale_y, coins)
+        _quantize(game.obstacles, scale_x, scale_y, obstacles)
+        power_ups = [(round(p.x * scale_x), round(p.y * scale_y), POWERUP_CODES[p.type])
+                     for p in game.power_ups]
+        now = game.time_ms
+        active = [(POWERUP_CODES[power_up_type],
+                   min(round(power_up.time_remaining(now) * 10), MAX_TENTHS))
+                  for power_up_type, power_up in game.active_power_ups.items()
+                  if power_up is not None]
+
+        keyframe = self.keyframe_due or self.frames % self.keyframe_interval == 0
+        self.keyframe_due = False
+        self.frames += 1
+        # Worst case: every position escaped, plus the bitmaps
+        self._reserve(64 + 6 * (len(coins) + len(obstacles)) + POWER_UP.size * len(power_ups)
+                      + ACTIVE.size * len(active))
+        buffer = self.buffer
+        pos = FRAME.size
+
+        if keyframe:
+            SCALARS.pack_into(buffer, pos, *scalars)
+            pos += SCALARS.size
+            for positions in (coins, obstacles):
+                COUNT.pack_into(buffer, pos, len(positions) // 2)
+                pos = _copy_positions(buffer, pos + COUNT.size, positions)
+            pos = self._write_power_ups(pos, power_ups, active)
+        else:
+            mask_pos = pos
+            pos += MASK.size
+            mask = 0
+            if scalars != self.scalars:
+                mask |= SCALARS_CHANGED
+                SCALARS.pack_into(buffer, pos, *scalars)
+                pos += SCALARS.size
+            for bit, positions, previous in ((COINS_CHANGED, coins, self.coins),
+                                             (OBSTACLES_CHANGED, obstacles, self.obstacles)):
+                if positions != previous:
+                    mask |= bit
+                    pos = self._write_entities(pos, positions, previous)
+            if power_ups != self.power_ups:
+                mask |= POWER_UPS_CHANGED
+                pos = self._write_power_ups(pos, power_ups, None)
+            if active != self.active:
+                mask |= ACTIVE_CHANGED
+                pos = self._write_power_ups(pos, None, active)
+            MASK.pack_into(buffer, mask_pos, mask)
+
+        FRAME.pack_into(buffer, 0, pos - COUNT.size, KEYFRAME if keyframe else DELTA, game.ticks)
+        self.scalars = scalars
+        self.coins, self.current_coins = coins, self.coins
+        self.obstacles, self.current_obstacles = obstacles, self.obstacles
+        self.power_ups = power_ups
+        self.active = active
+        return memoryview(buffer)[:pos]
+
+    def _write_entities(self, pos, positions, previous):
+        buffer = self.buffer
+        count = len(positions) // 2
+        if count != len(previous) // 2:
+            buffer[pos] = FULL
+            COUNT.pack_into(buffer, pos + 1, count)
+            return _copy_positions(buffer, pos + 1 + COUNT.size, positions)
+
+        buffer[pos] = MOVES
+        bitmap = pos + 1
+        pos = bitmap + (count + 7) // 8
+        buffer[bitmap:pos] = bytes(pos - bitmap)
+        for i in range(count):
+            x = positions[2 * i]
+            y = positions[2 * i + 1]
+            dx = x - previous[2 * i]
+            dy = y - previous[2 * i + 1]
+            if dx or dy:
+                buffer[bitmap + (i >> 3)] |= 1 << (i & 7)
+                if -127 <= dx <= 127 and -128 <= dy <= 127:
+                    MOVE.pack_into(buffer, pos, dx, dy)
+                    pos += MOVE.size
+                else:
+                    buffer[pos] = ESCAPE & 0xff
+                    POSITION.pack_into(buffer, pos + 1, x, y)
+                    pos += 1 + POSITION.size
+        return pos
+
+    def _write_power_ups(self, pos, power_ups, active):
+        """Falling power-ups and/or active ones, each a count and the records."""
+        buffer = self.buffer
+        if power_ups is not None:
+            COUNT.pack_into(buffer, pos, len(power_ups))
+            pos += COUNT.size
+            for record in power_ups:
+                POWER_UP.pack_into(buffer, pos, *record)
+                pos += POWER_UP.size
+        if active is not None:
+            buffer[pos] = len(active)  # at most one of each timed type
+            pos += 1
+            for record in active:
+                ACTIVE.pack_into(buffer, pos, *record)
+                pos += ACTIVE.size
+        return pos
+
+
+class StateDecoder:
+    """Rebuilds the encoded state from frames, which must come in order.
+
+    Positions are in base-resolution pixels. The first frame decoded must
+    be a keyframe.
+    """
+    def __init__(self):
+        self.synced = False
+        self.tick = 0
+        self.score = 0
+        self.level = 1
+        self.health = 0
+        self.flags = 0
+        self.player_x = 0
+        self.coins = array('h')  # x, y, x, y, ...
+        self.obstacles = array('h')
+        self.power_ups = []  # (x, y, power-up type)
+        self.active = []  # (power-up type, seconds left)
+
+    @property
+    def game_over(self):
+        return bool(self.flags & GAME_OVER)
+
+    @property
+    def invulnerable(self):
+        return bool(self.flags & INVULNERABLE)
+
+    def decode(self, frame):
+        """Apply one frame (a bytes-like object, size field included); returns its kind."""
+        size, kind, self.tick = FRAME.unpack_from(frame)
+        if size + COUNT.size != len(frame):
+            raise ValueError(f"frame says it is {size + COUNT.size} bytes but is {len(frame)}")
+        pos = FRAME.size
+        if kind == KEYFRAME:
+            pos = self._read_scalars(frame, pos)
+            for positions in (self.coins, self.obstacles):
+                count, = COUNT.unpack_from(frame, pos)
+                pos = _read_positions(frame, pos + COUNT.size, count, positions)
+            pos = self._read_power_ups(frame, pos)
+            pos = self._read_active(frame, pos)
+            self.synced = True
+        elif kind == DELTA:
+            if not self.synced:
+                raise ValueError("a delta frame before the first keyframe")
+            mask = frame[pos]
+            pos += MASK.size
+            if mask & SCALARS_CHANGED:
+                pos = self._read_scalars(frame, pos)
+            if mask & COINS_CHANGED:
+                pos = self._read_entities(frame, pos, self.coins)
+            if mask & OBSTACLES_CHANGED:
+                pos = self._read_entities(frame, pos, self.obstacles)
+            if mask & POWER_UPS_CHANGED:
+                pos = self._read_power_ups(frame, pos)
+            if mask & ACTIVE_CHANGED:
+                pos = self._read_active(frame, pos)
+        else:
+            raise ValueError(f"unknown frame kind {kind}")
+        return kind
+
+    def _read_scalars(self, frame, pos):
+        (self.score, self.level, self.health, self.flags,
+         self.player_x) = SCALARS.unpack_from(frame, pos)
+        return pos + SCALARS.size
+
+    def _read_entities(self, frame, pos, positions):
+        mode = frame[pos]
+        pos += 1
+        if mode == FULL:
+            count, = COUNT.unpack_from(frame, pos)
+            return _read_positions(frame, pos + COUNT.size, count, positions)
+
+        count = len(positions) // 2
+        bitmap = pos
+        pos += (count + 7) // 8
+        for i in range(count):
+            if frame[bitmap + (i >> 3)] & (1 << (i & 7)):
+                dx, dy = MOVE.unpack_from(frame, pos)
+                if dx == ESCAPE:
+                    positions[2 * i], positions[2 * i + 1] = POSITION.unpack_from(frame, pos + 1)
+                    pos += 1 + POSITION.size
+                else:
+                    positions[2 * i] += dx
+                    positions[2 * i + 1] += dy
+                    pos += MOVE.size
+        return pos
+
+    def _read_power_ups(self, frame, pos):
+        count, = COUNT.unpack_from(frame, pos)
+        pos += COUNT.size
+        power_ups = self.power_ups
+        power_ups.clear()
+        for _ in range(count):
+            x, y, code = POWER_UP.unpack_from(frame, pos)
+            power_ups.append((x, y, POWERUP_TYPES[code]))
+            pos += POWER_UP.size
+        return pos
+
+    def _read_active(self, frame, pos):
+        count = frame[pos]
+        pos += 1
+        active = self.active
+        active.clear()
+        for _ in range(count):
+            code, tenths = ACTIVE.unpack_from(frame, pos)
+            active.append((POWERUP_TYPES[code], tenths / 10))
+            pos += ACTIVE.size
+        return pos
+
+
+class FrameReader:
+    """Splits a byte stream into frames, however it arrives in pieces."""
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """Add received bytes; yields every frame now complete, each a
+        memoryview valid until the generator resumes."""
+        buffer = self.buffer
+        buffer += data
+        pos = 0
+        try:
+            with memoryview(buffer) as view:
+                while len(buffer) - pos >= COUNT.size:
+                    end = pos + COUNT.size + COUNT.unpack_from(buffer, pos)[0]
+                    if end > len(buffer):
+                        break
+                    with view[pos:end] as frame:
+                        pos = end  # consumed, even if the caller stops here
+                        yield frame
+        finally:
+            del buffer[:pos]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the state stream of a bot-played game")
+    parser.add_argument('--ticks', type=int, default=3600)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--swarm', action='store_true')
+    parser.add_argument('--keyframe-interval', type=int, default=60)
+    args = parser.parse_args()
+
+    from headless import ChaseInput
+    from main import Game
+    from server import game_state
+
+    game = Game(input_provider=ChaseInput(), seed=args.seed, swarm=args.swarm)
+    encoder = StateEncoder(args.keyframe_interval)
+    decoder = StateDecoder()
+    sizes = {KEYFRAME: [], DELTA: []}
+    json_bytes = 0
+    for _ in range(args.ticks):
+        game.update()
+        if game.game_over:
+            game.reset_game()
+        frame = encoder.encode(game)
+        sizes[decoder.decode(frame)].append(len(frame))
+        json_bytes += len(json.dumps(game_state(game), separators=(',', ':')))
+        frame.release()
+
+    total = sum(map(sum, sizes.values()))
+    print(f"{args.ticks} frames, {total:,} bytes ({total / args.ticks:.1f} per frame; "
+          f"JSON of the whole state {json_bytes / args.ticks:.1f} per tick)")
+    for kind, name in ((KEYFRAME, 'keyframes'), (DELTA, 'deltas')):
+        if sizes[kind]:
+            print(f"  {len(sizes[kind])} {name}, {sum(sizes[kind]) / len(sizes[kind]):.1f} bytes on average")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""Sweep difficulty settings over many bot-played games on every core.
+
+Every combination of the swept values is played with the same seeds, so
+differences between rows come from the settings rather than the luck of
+the draw. Games run headless in a ProcessPoolExecutor, a chunk of seeds per
+task, and each task sends back one small tuple per game.
+
+    python sweep.py --runs 2000 --set level_multiplier=1.1,1.2,1.3 --set unlock_invincible=5,7
+
+Sweepable settings are the Game attributes in SETTINGS, plus
+unlock_<power-up type> for entries of Game.powerup_unlock_levels.
+"""
+import os
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # once per worker otherwise
+
+import argparse
+import csv
+import itertools
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from headless import ChaseInput, RandomInput
+from main import (POWERUP_DOUBLE_POINTS, POWERUP_HEALTH, POWERUP_INVINCIBLE,
+                  POWERUP_SLOW_OBSTACLES, TICK_RATE, Game)
+
+# Sweepable Game attributes and how to parse their values
+SETTINGS = {
+    'level_multiplier': float,
+    'coins_for_next_level': int,
+    'power_up_spawn_chance': float,
+    'invulnerable_duration': int,
+}
+UNLOCK_PREFIX = 'unlock_'
+POWER_UP_TYPES = (POWERUP_HEALTH, POWERUP_DOUBLE_POINTS, POWERUP_SLOW_OBSTACLES,
+                  POWERUP_INVINCIBLE)
+
+
+def parse_setting(text):
+    """'name=v1,v2' -> (name, [v1, v2])"""
+    name, _, values = text.partition('=')
+    if name in SETTINGS:
+        kind = SETTINGS[name]
+    elif name.startswith(UNLOCK_PREFIX):
+        if name[len(UNLOCK_PREFIX):] not in POWER_UP_TYPES:
+            raise argparse.ArgumentTypeError(
+                f"no power-up called {name[len(UNLOCK_PREFIX):]!r}; "
+                f"choose from {', '.join(POWER_UP_TYPES)}")
+        kind = int
+    else:
+        raise argparse.ArgumentTypeError(f"can't sweep {name!r}")
+    try:
+        return name, [kind(value) for value in values.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"bad value in {text!r}")
+
+
+def configure(game, config):
+    for name, value in config.items():
+        if name.startswith(UNLOCK_PREFIX):
+            power_up_type = name[len(UNLOCK_PREFIX):]
+            if power_up_type not in game.powerup_unlock_levels:
+                raise ValueError(f"no power-up called {power_up_type!r}")
+            game.powerup_unlock_levels[power_up_type] = value
+        else:
+            setattr(game, name, value)
+
+
+def play(config, seed, bot, max_ticks):
+    """Play one game to game over or max_ticks: (level, score, ticks, damage taken)."""
+    input_provider = ChaseInput() if bot == 'chase' else RandomInput(random.Random(seed))
+    game = Game(input_provider=input_provider, seed=seed)
+    configure(game, config)
+    damage = 0
+    health = game.current_health
+    while not game.game_over and game.ticks < max_ticks:
+        game.update()
+        if game.current_health < health:
+            damage += health - game.current_health
+        health = game.current_health
+    return game.level, game.score, game.ticks, damage
+
+
+def run_chunk(index, config, seeds, bot, max_ticks):
+    """Worker task: play `seeds` with one config."""
+    return index, [(seed, *play(config, seed, bot, max_ticks)) for seed in seeds]
+
+
+def summarize(runs, max_ticks, tick_rate):
+    levels = [run[1] for run in runs]
+    return {
+        'runs': len(runs),
+        'level_mean': statistics.fmean(levels),
+        'level_median': statistics.median(levels),
+        'level_max': max(levels),
+        'score_mean': statistics.fmean(run[2] for run in runs),
+        'seconds_mean': statistics.fmean(run[3] for run in runs) / tick_rate,
+        'damage_mean': statistics.fmean(run[4] for run in runs),
+        'survived': sum(run[3] >= max_ticks for run in runs) / len(runs),
+    }
+
+
+def print_table(configs, summaries):
+    names = list(configs[0])
+    columns = ['level_mean', 'level_median', 'level_max', 'score_mean', 'seconds_mean',
+               'damage_mean', 'survived']
+    header = names + ['runs'] + columns
+    rows = []
+    for config, summary in zip(configs, summaries):
+        row = [str(config[name]) for name in names] + [str(summary['runs'])]
+        for column in columns:
+            value = summary[column]
+            row.append(f"{value:.0%}" if column == 'survived' else
+                       f"{value:.2f}" if isinstance(value, float) else str(value))
+        rows.append(row)
+    widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+    for row in [header] + rows:
+        print('  '.join(cell.rjust(width) for cell, width in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep Coin Collector difficulty settings")
+    parser.add_argument('--set', dest='settings', type=parse_setting, action='append', default=[],
+                        metavar='NAME=V1,V2', help="values to sweep for one setting")
+    parser.add_argument('--runs', type=int, default=1000, help="games per combination")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the first game")
+    parser.add_argument('--bot', choices=['chase', 'random'], default='chase')
+    parser.add_argument('--max-ticks', type=int, default=36000, help="cut games off here")
+    parser.add_argument('--chunk', type=int, default=50, help="games per worker task")
+    parser.add_argument('--workers', type=int, default=None, help="default: one per core")
+    parser.add_argument('--output', metavar='CSV', help="also write every game's stats here")
+    args = parser.parse_args()
+
+    names = [name for name, _ in args.settings]
+    configs = [dict(zip(names, values))
+               for values in itertools.product(*(values for _, values in args.settings))]
+    seeds = range(args.seed, args.seed + args.runs)
+    runs = [[] for _ in configs]
+    total = len(configs) * args.runs
+    done = 0
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.workers) as executor:
+        futures = [executor.submit(run_chunk, index, config, seeds[i:i + args.chunk],
+                                   args.bot, args.max_ticks)
+                   for index, config in enumerate(configs)
+                   for i in range(0, args.runs, args.chunk)]
+        for future in as_completed(futures):
+            index, results = future.result()
+            runs[index].extend(results)
+            done += len(results)
+            print(f"\r{done}/{total} games", end='', flush=True)
+    elapsed = time.perf_counter() - start
+    ticks = sum(run[3] for config_runs in runs for run in config_runs)
+    print(f"\r{total} games, {ticks:,} ticks in {elapsed:.1f}s ({ticks / elapsed:,.0f} ticks/sec)")
+
+    print_table(configs, [summarize(config_runs, args.max_ticks, TICK_RATE)
+                          for config_runs in runs])
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(names + ['seed', 'level', 'score', 'ticks', 'damage'])
+            for config, config_runs in zip(configs, runs):
+                for run in sorted(config_runs):
+                    writer.writerow([config[name] for name in names] + list(run))
+
+
+if __name__ == '__main__':
+    main()
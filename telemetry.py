@@ -0,0 +1,414 @@
+"""Run telemetry and the high score table, saved in the background.
+
+Every run that ends, by game over, restart or quitting, becomes one record:
+score, level reached, time played, damage taken, power-ups picked up and a
+summary of its frame times. RunLog ranks it in the high score table, which
+lives in memory, and hands it to a writer through a bounded queue. The
+writer appends records to the log in batches, away from the game loop: a
+thread writing a JSON-lines file on the desktop, or an asyncio task writing
+the browser's localStorage in the pygbag build, which has no threads. When
+the queue is full a record is dropped from the log rather than keeping a
+frame waiting.
+
+The log is append-only. Every COMPACT_EVERY records the writer rewrites it
+with the best TOP_SIZE runs and the latest KEEP_RECENT, and it does the
+same when it starts on a log that earlier sessions left longer than that,
+so however short the sessions, the log stays small enough to read in full
+when the game starts.
+
+    python telemetry.py runs.jsonl            # the high score table
+    python telemetry.py runs.jsonl --recent 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_right
+
+TOP_SIZE = 100  # runs in the high score table
+KEEP_RECENT = 1000  # latest runs compaction keeps along with the best
+COMPACT_EVERY = 500  # records appended between compactions
+QUEUE_SIZE = 256  # records waiting for the writer
+BATCH_SIZE = 64  # most records in one write
+FLUSH_INTERVAL = 2.0  # seconds a record waits for others to be written with
+STORAGE_KEY = 'coin_collector.runs'  # localStorage item in the web build
+
+# Frame time histogram of a run: FRAME_BUCKET_MS wide buckets, the last one
+# taking everything slower
+FRAME_BUCKET_MS = 0.25
+FRAME_BUCKETS = 400
+
+
+def score_key(record):
+    """High score order: best score first, then the higher level, then the earlier run."""
+    return -record['score'], -record['level'], record['time']
+
+
+def compact(records, top_size=TOP_SIZE, keep_recent=KEEP_RECENT):
+    """The records worth keeping, in log order: the best and the latest."""
+    ranked = sorted(range(len(records)), key=lambda i: score_key(records[i]))
+    keep = set(ranked[:top_size])
+    keep.update(range(max(0, len(records) - keep_recent), len(records)))
+    return [record for i, record in enumerate(records) if i in keep]
+
+
+def parse(lines):
+    """Records from log lines; a line torn by a crash mid-write is skipped."""
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            pass
+    return records
+
+
+def dump(record):
+    return json.dumps(record, separators=(',', ':')) + '\n'
+
+
+class FileStore:
+    """The log as a JSON-lines file."""
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return f.readlines()
+        except FileNotFoundError:
+            return []
+
+    def append(self, lines):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(lines))
+
+    def rewrite(self, lines):
+        # Replaced whole, so a crash leaves the old log or the new one
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write(''.join(lines))
+        os.replace(temporary, self.path)
+
+
+class BrowserStore:
+    """The log as one localStorage item, for the pygbag build.
+
+    localStorage only stores whole strings, so the log is kept in memory
+    too and every write sets all of it; batching makes that rare.
+    """
+    def __init__(self, key=STORAGE_KEY, storage=None):
+        if storage is None:
+            import platform  # pygbag's, which exposes the page's window
+            storage = platform.window.localStorage
+        self.storage = storage
+        self.key = key
+        self.text = self.storage.getItem(key) or ''
+
+    def load(self):
+        return self.text.splitlines(keepends=True)
+
+    def append(self, lines):
+        self.text += ''.join(lines)
+        self.storage.setItem(self.key, self.text)
+
+    def rewrite(self, lines):
+        self.text = ''.join(lines)
+        self.storage.setItem(self.key, self.text)
+
+
+class LogWriter:
+    """Writes batches of records to a store, compacting it now and then.
+
+    Subclasses run write() away from the game loop and feed it from a
+    bounded queue; submit() never waits.
+    """
+    def __init__(self, store, compact_every=COMPACT_EVERY, logged=0):
+        self.store = store
+        self.compact_every = compact_every
+        self.logged = logged  # records in the log, counting those already there
+        self.appended = 0  # records since the last compaction
+        self.error = None  # the last failed write, if any
+
+    def compact_if_long(self):
+        """Compact a log left longer than it's kept; the first thing run() does."""
+        if self.logged > TOP_SIZE + KEEP_RECENT:
+            try:
+                self.compact()
+            except Exception as exc:
+                self.error = exc
+
+    def write(self, batch):
+        try:
+            self.store.append([dump(record) for record in batch])
+            self.logged += len(batch)
+            self.appended += len(batch)
+            if self.appended >= self.compact_every:
+                self.compact()
+        except Exception as exc:  # a bad record or store mustn't kill the writer
+            self.error = exc
+
+    def compact(self):
+        records = compact(parse(self.store.load()))
+        self.store.rewrite([dump(record) for record in records])
+        self.logged = len(records)
+        self.appended = 0
+
+
+class ThreadWriter(LogWriter):
+    """A LogWriter on a daemon thread."""
+    def __init__(self, store, compact_every=COMPACT_EVERY, logged=0):
+        super().__init__(store, compact_every, logged)
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.thread = threading.Thread(target=self.run, name='run-log-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, record):
+        """Queue a record to write; False if the queue is full."""
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except queue.Full:
+            return False
+
+    def run(self):
+        # None on the queue asks for what's left to be written, then stops
+        self.compact_if_long()
+        closing = False
+        while not closing:
+            record = self.queue.get()
+            if record is None:
+                break
+            batch = [record]
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    record = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if record is None:
+                    closing = True
+                    break
+                batch.append(record)
+            self.write(batch)
+
+    async def close(self, timeout=5.0):
+        """Write what's queued and stop, waiting up to `timeout` seconds for
+        each on a worker thread, so the event loop keeps running."""
+        await asyncio.to_thread(self.stop, timeout)
+
+    def stop(self, timeout):
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            # The writer is stuck; it's a daemon thread, so exit won't wait on it
+            self.error = TimeoutError("run log writer didn't take the queued records")
+            return
+        self.thread.join(timeout)
+
+
+class AsyncWriter(LogWriter):
+    """A LogWriter as an asyncio task, for platforms without threads.
+
+    The writes themselves are quick in-memory calls there, so running them
+    on the event loop between frames is fine.
+    """
+    def __init__(self, store, compact_every=COMPACT_EVERY, logged=0):
+        super().__init__(store, compact_every, logged)
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def submit(self, record):
+        """Queue a record to write; False if the queue is full."""
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def run(self):
+        self.compact_if_long()
+        closing = False
+        while not closing:
+            record = await self.queue.get()
+            if record is None:
+                break
+            batch = [record]
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + FLUSH_INTERVAL
+            while len(batch) < BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if record is None:
+                    closing = True
+                    break
+                batch.append(record)
+            self.write(batch)
+
+    async def close(self, timeout=5.0):
+        await self.queue.put(None)
+        await asyncio.wait_for(self.task, timeout)
+
+
+class RunLog:
+    """The high score table, kept in memory, over a log written in the background.
+
+    The table is sorted as runs are added, so top() is a slice.
+    """
+    def __init__(self, store, writer_class, top_size=TOP_SIZE):
+        self.top_size = top_size
+        self.best = []  # records, best first
+        self.keys = []  # score_key() of each
+        self.dropped = 0  # records the writer had no room for
+        records = parse(store.load())
+        for record in records:
+            self.rank(record)
+        self.writer = writer_class(store, logged=len(records))
+
+    @classmethod
+    def open(cls, path):
+        """The log for this platform: a file at `path`, or in the browser localStorage."""
+        if sys.platform == 'emscripten':
+            return cls(BrowserStore(), AsyncWriter)
+        return cls(FileStore(path), ThreadWriter)
+
+    def rank(self, record):
+        """Put a record in the high score table: its place from 0, or None if it didn't make it."""
+        key = score_key(record)
+        place = bisect_right(self.keys, key)
+        if place >= self.top_size:
+            return None
+        self.keys.insert(place, key)
+        self.best.insert(place, record)
+        del self.keys[self.top_size:], self.best[self.top_size:]
+        return place
+
+    def add(self, record):
+        """Rank a finished run and queue it for the log; returns its place."""
+        if not self.writer.submit(record):
+            self.dropped += 1
+        return self.rank(record)
+
+    def top(self, n):
+        return self.best[:n]
+
+    async def close(self):
+        await self.writer.close()
+
+
+class Telemetry:
+    """Collects the stats of a game's runs and adds each one to a RunLog.
+
+    Sets itself as the game's `telemetry`. Game reports damage, power-ups,
+    game over and restarts; the loop in main() reports each drawn frame's
+    time, and calls close() when it ends, which logs the run in progress.
+    """
+    def __init__(self, game, log):
+        self.log = log
+        self.last_run = None  # the record of the run that ended last
+        self.start(game)
+        game.telemetry = self
+
+    def start(self, game):
+        self.running = True
+        self.start_tick = game.ticks
+        self.damage_taken = 0
+        self.power_ups = {}
+        self.frame_times = array('I', bytes(4 * FRAME_BUCKETS))
+
+    def frame(self, frame_ms):
+        if self.running:
+            self.frame_times[min(int(frame_ms / FRAME_BUCKET_MS), FRAME_BUCKETS - 1)] += 1
+
+    # Called by Game
+    def damage(self, game):
+        self.damage_taken += 1
+
+    def power_up(self, game, power_up_type):
+        self.power_ups[power_up_type] = self.power_ups.get(power_up_type, 0) + 1
+
+    def game_over(self, game):
+        self.finish(game, 'game_over')
+
+    def reset(self, game):
+        if self.running:
+            self.finish(game, 'restart')
+        self.start(game)
+
+    async def close(self, game):
+        if self.running and game.ticks > self.start_tick:
+            self.finish(game, 'quit')
+        await self.log.close()
+
+    def finish(self, game, ending):
+        """Log the run in progress as ended by `ending`; once per run."""
+        if not self.running:
+            return
+        self.running = False
+        record = {
+            'time': round(time.time(), 3),
+            'ending': ending,
+            'score': game.score,
+            'level': game.level,
+            'seconds': round((game.ticks - self.start_tick) * game.tick_ms / 1000, 2),
+            'damage': self.damage_taken,
+            'power_ups': self.power_ups,
+            'frame_ms': self.frame_summary(),
+        }
+        self.last_run = record
+        self.log.add(record)
+
+    def frame_summary(self):
+        """Frames drawn in the run and their p50/p95/p99 time in ms, to the bucket."""
+        frames = sum(self.frame_times)
+        summary = {'frames': frames}
+        if not frames:
+            return summary
+        percentiles = [50, 95, 99]
+        seen = 0
+        for bucket, count in enumerate(self.frame_times):
+            seen += count
+            while percentiles and seen >= frames * percentiles[0] / 100:
+                summary[f'p{percentiles.pop(0)}'] = (bucket + 1) * FRAME_BUCKET_MS
+            if not percentiles:
+                break
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the high scores and runs in a run log")
+    parser.add_argument('path', help="the log, e.g. runs.jsonl")
+    parser.add_argument('--top', type=int, default=10, help="high scores to show")
+    parser.add_argument('--recent', type=int, default=0, help="also show the latest runs")
+    args = parser.parse_args()
+
+    records = parse(FileStore(args.path).load())
+    print(f"{len(records)} runs, {sum(record['seconds'] for record in records) / 3600:.1f} hours played")
+    for place, record in enumerate(sorted(records, key=score_key)[:args.top], 1):
+        print(f"{place:>3}. {record['score']:>7}  level {record['level']:>3}  "
+              f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(record['time']))}")
+    if args.recent:
+        print("latest runs:")
+        for record in records[-args.recent:]:
+            frame_ms = record['frame_ms']
+            frames = f", p95 frame {frame_ms['p95']:.2f} ms" if 'p95' in frame_ms else ''
+            print(f"  {record['ending']:<9} score {record['score']}, level {record['level']}, "
+                  f"{record['seconds']:.0f}s, {record['damage']} damage, "
+                  f"power-ups {record['power_ups'] or 'none'}{frames}")
+
+
+if __name__ == '__main__':
+    main()